@@ -6,6 +6,12 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+
+def _env_flag(name: str, default: str) -> bool:
+    """Read a boolean environment variable; "1", "true", "yes" and "on" (any case) are true."""
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
 class Settings(BaseSettings):
     # API settings
     API_V1_STR: str = "/api/v1"
@@ -32,7 +38,7 @@ class Settings(BaseSettings):
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
     # Observability settings
-    ENABLE_TRACING: bool = os.getenv("ENABLE_TRACING", "false").lower() in ("1", "true", "yes", "on")
+    ENABLE_TRACING: bool = _env_flag("ENABLE_TRACING", "false")
     
     # MCP Tools settings
     # Maximum number of MCP tools to load per agent to prevent token overflow
@@ -40,6 +46,40 @@ class Settings(BaseSettings):
     # Default of 0 means "no limit" so all MCP tools remain available.
     MAX_MCP_TOOLS_PER_AGENT: int = int(os.getenv("MAX_MCP_TOOLS_PER_AGENT", "0"))
 
+    # LLM provider settings (read once at startup instead of on every LLM initialization)
+    # Route LLM clients through LiteLLM when it is installed
+    USE_LITELLM: bool = _env_flag("USE_LITELLM", "true")
+    # Fall back to other models/providers when a provider rate-limits a request
+    ENABLE_RATE_LIMIT_FALLBACK: bool = _env_flag("ENABLE_RATE_LIMIT_FALLBACK", "true")
+    # Open connections to configured LLM providers at startup so the first request skips TCP/TLS setup
+    LLM_CONNECTION_PREWARM: bool = _env_flag("LLM_CONNECTION_PREWARM", "true")
+
+    # LLM response cache settings
+    # Exact-match in-memory cache for identical prompts sent to the same LLM configuration
+    LLM_CACHE_ENABLED: bool = _env_flag("LLM_CACHE_ENABLED", "true")
+    LLM_CACHE_MAXSIZE: int = int(os.getenv("LLM_CACHE_MAXSIZE", "10000"))
+
+    # Semantic tier of the agent prompt cache (temperature-0 agents): reuse the response of an
+    # earlier prompt whose embedding has at least this cosine similarity. Requires Ollama.
+    SEMANTIC_CACHE_ENABLED: bool = _env_flag("SEMANTIC_CACHE_ENABLED", "false")
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_EMBEDDING_MODEL: str = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "qwen3-embedding:0.6b")
+    # Ollama server used for the semantic cache embeddings
+    OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+    # Directory for the disk-backed workflow node response cache (analysis/plan-execute
+    # outputs of deterministic agents). Set to an empty string to disable persistence.
+    NODE_DISK_CACHE_DIR: str = os.getenv("NODE_DISK_CACHE_DIR", ".cache/agent_nodes")
+
+    # Agent batch execution settings
+    # Maximum number of requests AgentService.arun_batch sends to the LLM backend at once
+    AGENT_BATCH_MAX_CONCURRENCY: int = int(os.getenv("AGENT_BATCH_MAX_CONCURRENCY", "16"))
+
+    # Worker threads for blocking agent work, kept apart from the default asyncio executor:
+    # synchronous LLM graph invocations and Mem0 memory search/writes
+    LLM_EXECUTOR_MAX_WORKERS: int = int(os.getenv("LLM_EXECUTOR_MAX_WORKERS", "64"))
+    MEMORY_EXECUTOR_MAX_WORKERS: int = int(os.getenv("MEMORY_EXECUTOR_MAX_WORKERS", "8"))
+
     # OpenTelemetry / Traceloop
     TRACELOOP_BASE_URL: Optional[str] = None
     OTEL_EXPORTER_OTLP_ENDPOINT: Optional[str] = None
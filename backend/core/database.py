@@ -1,14 +1,52 @@
+import logging
+from typing import Optional
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_database_url(url: str) -> Optional[str]:
+    """Map a sync database URL to its asyncio driver (aiosqlite / asyncpg).
+    
+    None for URLs the async engine cannot serve as the same database: in-memory SQLite (each
+    engine gets its own empty database) and URLs with query arguments, which are driver
+    specific (e.g. psycopg2's sslmode is rejected by asyncpg).
+    """
+    if "?" in url:
+        return None
+    if url.startswith("sqlite:"):
+        path = url[len("sqlite:"):]
+        if path in ("", "//", "///:memory:"):
+            return None
+        return "sqlite+aiosqlite:" + path
+    for prefix in ("postgresql+psycopg2:", "postgresql:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return None
+
+
+# Async engine for queries awaited on the event loop. Optional: None when the asyncio driver
+# for the configured database is not installed, and callers fall back to SessionLocal.
+async_engine = None
+AsyncSessionLocal = None
+_async_url = _async_database_url(SQLALCHEMY_DATABASE_URL)
+if _async_url:
+    try:
+        async_engine = create_async_engine(_async_url)
+        AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+    except Exception as e:
+        logger.info(f"Async database driver unavailable, using sync sessions only: {e}")
+
 Base = declarative_base()
 
 async def init_db():
@@ -37,4 +75,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional, Sequence
+from typing import List, Dict, Any, Optional, Sequence, Union, Callable
 import logging
 import asyncio
 from langgraph.graph import StateGraph, END
@@ -15,7 +15,7 @@ logger = logging.getLogger(__name__)
 class AgentBuilder:
     """Builds a LangGraph agent with MCP tool support."""
     
-    def __init__(self, llm: Runnable, recursion_limit: int = 50):
+    def __init__(self, llm: Runnable, recursion_limit: int = 50, cache_system_prompt: bool = False):
         """
         Initialize AgentBuilder.
         
@@ -23,8 +23,11 @@ class AgentBuilder:
             llm: The language model to use
             recursion_limit: Maximum number of agent iterations (default: 50)
                             This is the single source of truth for iteration limits.
+            cache_system_prompt: Mark the system prompt as an Anthropic prompt-cache
+                                 breakpoint so tool-loop iterations reuse the cached prefix
         """
         self.llm = llm
+        self.cache_system_prompt = cache_system_prompt
         self.tools = []
         self.external_tools = []
         # Rate limiting protection
@@ -49,8 +52,13 @@ class AgentBuilder:
             self.tools.append(tool)
             self.external_tools.append(tool)
             
-    def build(self, system_prompt: str = ""):
-        """Build the StateGraph."""
+    def build(self, system_prompt: Union[str, Callable[[], str]] = ""):
+        """Build the StateGraph.
+        
+        Args:
+            system_prompt: System prompt text, or a callable returning it for each LLM call
+                           (lets a compiled graph be reused with per-request context)
+        """
         
         # Initialize executor with external tools and increased delay
         self.tool_executor = ToolExecutor(external_tools=self.external_tools, tool_call_delay=1.0)
@@ -60,14 +68,15 @@ class AgentBuilder:
             logger.info(f"📋 Binding {len(self.tools)} tools to LLM")
             
             # Log tool names for debugging
-            tool_names = []
-            for tool in self.tools:
-                if isinstance(tool, dict):
-                    tool_name = tool.get("function", {}).get("name", "unknown")
-                    tool_names.append(tool_name)
-                else:
-                    tool_names.append(getattr(tool, 'name', 'unknown'))
-            logger.info(f"  Tool names: {', '.join(tool_names[:10])}{'...' if len(tool_names) > 10 else ''}")
+            if logger.isEnabledFor(logging.INFO):
+                tool_names = []
+                for tool in self.tools:
+                    if isinstance(tool, dict):
+                        tool_name = tool.get("function", {}).get("name", "unknown")
+                        tool_names.append(tool_name)
+                    else:
+                        tool_names.append(getattr(tool, 'name', 'unknown'))
+                logger.info("  Tool names: %s%s", ', '.join(tool_names[:10]), '...' if len(tool_names) > 10 else '')
             
             # For Groq models, we need to use strict mode and tool_choice to force proper function calling
             # Groq's smaller models (like llama-3.1-8b-instant) have poor function calling support
@@ -104,12 +113,19 @@ class AgentBuilder:
                 }
             
             messages = state["messages"]
+            system_content = system_prompt() if callable(system_prompt) else system_prompt
+            if system_content and self.cache_system_prompt:
+                system_message = SystemMessage(content=[
+                    {"type": "text", "text": system_content, "cache_control": {"type": "ephemeral"}}
+                ])
+            else:
+                system_message = SystemMessage(content=system_content)
             # Ensure system prompt is the first message if provided
-            if system_prompt and not isinstance(messages[0], SystemMessage):
-                messages = [SystemMessage(content=system_prompt)] + list(messages)
-            elif system_prompt and isinstance(messages[0], SystemMessage):
+            if system_content and not isinstance(messages[0], SystemMessage):
+                messages = [system_message] + list(messages)
+            elif system_content and isinstance(messages[0], SystemMessage):
                  # Update existing system prompt
-                 messages = [SystemMessage(content=system_prompt)] + list(messages)[1:]
+                 messages = [system_message] + list(messages)[1:]
 
             # Apply adaptive delay if recent rate limits
             if self.adaptive_delay > 0:
@@ -7,6 +7,20 @@ from langchain_core.tools import Tool
 
 logger = logging.getLogger(__name__)
 
+
+def _mcp_content_text(items) -> str:
+    """Join the text of MCP content items (TextContent objects or dicts), stringifying anything else."""
+    content_parts = []
+    for item in items:
+        if hasattr(item, 'text'):
+            content_parts.append(item.text)
+        elif isinstance(item, dict) and 'text' in item:
+            content_parts.append(item['text'])
+        else:
+            content_parts.append(str(item))
+    return "\n".join(content_parts)
+
+
 class ToolExecutor:
     """Executes tools requested by the LLM."""
     
@@ -85,26 +99,10 @@ class ToolExecutor:
                         # Handle MCP content types
                         if isinstance(result, list):
                             # Extract text from TextContent objects
-                            content_parts = []
-                            for item in result:
-                                if hasattr(item, 'text'):
-                                    content_parts.append(item.text)
-                                elif isinstance(item, dict) and 'text' in item:
-                                    content_parts.append(item['text'])
-                                else:
-                                    content_parts.append(str(item))
-                            content = "\n".join(content_parts)
+                            content = _mcp_content_text(result)
                         elif hasattr(result, 'content') and isinstance(result.content, list):
-                             # Handle CallToolResult object
-                            content_parts = []
-                            for item in result.content:
-                                if hasattr(item, 'text'):
-                                    content_parts.append(item.text)
-                                elif isinstance(item, dict) and 'text' in item:
-                                    content_parts.append(item['text'])
-                                else:
-                                    content_parts.append(str(item))
-                            content = "\n".join(content_parts)
+                            # Handle CallToolResult object
+                            content = _mcp_content_text(result.content)
                         else:
                             content = str(result)
                         
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 import warnings
 
@@ -32,6 +33,15 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Warning: Could not initialize telemetry: {e}")
 
+    # Pre-warm LLM provider connections in the background (never blocks startup); the task
+    # is kept so it is not garbage-collected mid-flight and can be cancelled on shutdown
+    prewarm_task = None
+    if settings.LLM_CONNECTION_PREWARM:
+        try:
+            from services.llm_service import prewarm_provider_connections
+            prewarm_task = asyncio.create_task(prewarm_provider_connections())
+        except Exception as e:
+            print(f"Warning: Could not pre-warm LLM provider connections: {e}")
     
     # Load MCP configuration from file if it exists
     try:
@@ -65,6 +75,20 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    try:
+        from services.agent_service import drain_memory_writes
+        await drain_memory_writes()
+    except Exception as e:
+        print(f"Warning: Error writing queued memories: {e}")
+    
+    if prewarm_task is not None and not prewarm_task.done():
+        prewarm_task.cancel()
+    try:
+        from services.llm_service import close_http_clients
+        await close_http_clients()
+    except Exception as e:
+        print(f"Warning: Error closing LLM HTTP clients: {e}")
+    
     try:
         from services.scheduling_service import scheduler
         if scheduler.running:
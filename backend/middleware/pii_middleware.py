@@ -10,13 +10,33 @@ Strategies:
 - redact: Replace with [REDACTED_TYPE]
 - mask: Partially obscure (e.g., ****-****-****-1234)
 - hash: Replace with deterministic hash
+
+If the optional `hyperscan` package (Vectorscan on ARM) is installed, one multi-pattern
+scan per message selects the rules that need a full regex pass.
 """
 
 import re
 import hashlib
-from typing import Dict, List, Optional, Callable, Any
+import functools
+import logging
+from typing import Dict, List, Optional, Callable, Any, Pattern, Set, Tuple
 from enum import Enum
 
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except Exception:
+    HYPERSCAN_AVAILABLE = False
+    hyperscan = None
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_pattern(pattern: str, flags: int = 0) -> Pattern:
+    """Compile a detection pattern once per process"""
+    return re.compile(pattern, flags)
+
 
 class PIIStrategy(str, Enum):
     """PII handling strategies"""
@@ -91,35 +111,92 @@ class PIIDetector:
     ]
     
     @classmethod
-    def detect(cls, text: str, pii_type: str) -> List[str]:
-        """Detect PII of a specific type in text"""
-        matches = []
-        
-        # Handle built-in types
+    def patterns_for(cls, pii_type: str) -> List[Tuple[str, int]]:
+        """Return the (pattern, re flags) pairs used to detect a built-in PII type"""
         if pii_type in cls.PATTERNS:
-            pattern = cls.PATTERNS[pii_type]
-            matches = re.findall(pattern, text, re.IGNORECASE)
+            return [(cls.PATTERNS[pii_type], re.IGNORECASE)]
         elif pii_type == PIIType.FINANCIAL:
-            for pattern in cls.FINANCIAL_PATTERNS:
-                matches.extend(re.findall(pattern, text, re.IGNORECASE))
+            return [(pattern, re.IGNORECASE) for pattern in cls.FINANCIAL_PATTERNS]
         elif pii_type == PIIType.MEDICAL:
-            for pattern in cls.MEDICAL_PATTERNS:
-                matches.extend(re.findall(pattern, text, re.IGNORECASE))
+            return [(pattern, re.IGNORECASE) for pattern in cls.MEDICAL_PATTERNS]
         elif pii_type == PIIType.NAME:
-            for pattern in cls.NAME_PATTERNS:
-                matches.extend(re.findall(pattern, text))
+            return [(pattern, 0) for pattern in cls.NAME_PATTERNS]
         elif pii_type == PIIType.ADDRESS:
-            for pattern in cls.ADDRESS_PATTERNS:
-                matches.extend(re.findall(pattern, text))
-        
-        # Return unique matches
+            return [(pattern, 0) for pattern in cls.ADDRESS_PATTERNS]
+        return []
+    
+    @staticmethod
+    def find_all(text: str, patterns: List[Pattern]) -> List[str]:
+        """Return the unique matches of compiled patterns in text"""
+        matches = []
+        for pattern in patterns:
+            matches.extend(pattern.findall(text))
         return list(set([m if isinstance(m, str) else ''.join(m) for m in matches]))
     
+    @classmethod
+    def detect(cls, text: str, pii_type: str) -> List[str]:
+        """Detect PII of a specific type in text"""
+        patterns = [_compile_pattern(pattern, flags) for pattern, flags in cls.patterns_for(pii_type)]
+        return cls.find_all(text, patterns)
+    
     @classmethod
     def detect_with_custom_pattern(cls, text: str, pattern: str) -> List[str]:
         """Detect PII using a custom regex pattern"""
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        return list(set([m if isinstance(m, str) else ''.join(m) for m in matches]))
+        return cls.find_all(text, [_compile_pattern(pattern, re.IGNORECASE)])
+
+
+class PIIPrefilter:
+    """
+    Single-pass check of which PII rules can match a text.
+    
+    Each rule is a list of (pattern, re flags). With hyperscan installed, all patterns are
+    compiled into one block-mode database (prefilter mode, so constructs hyperscan does not
+    support are approximated without false negatives) and one SIMD scan returns the ids of
+    rules that may match; only those get a full `re` pass. Without hyperscan, or if the
+    patterns do not compile, every rule is a candidate.
+    """
+    
+    def __init__(self, rules: List[List[Tuple[str, int]]]):
+        self._all_rules = set(range(len(rules)))
+        self._database = self._compile(rules) if HYPERSCAN_AVAILABLE else None
+    
+    @staticmethod
+    def _compile(rules: List[List[Tuple[str, int]]]):
+        expressions, ids, flags = [], [], []
+        for rule_id, patterns in enumerate(rules):
+            for pattern, re_flags in patterns:
+                hs_flags = (hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH |
+                            hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP)
+                if re_flags & re.IGNORECASE:
+                    hs_flags |= hyperscan.HS_FLAG_CASELESS
+                expressions.append(pattern.encode())
+                ids.append(rule_id)
+                flags.append(hs_flags)
+        if not expressions:
+            return None
+        try:
+            database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+            database.compile(expressions=expressions, ids=ids, elements=len(expressions), flags=flags)
+            return database
+        except Exception as e:
+            logger.warning(f"Could not compile PII patterns with hyperscan, falling back to re: {e}")
+            return None
+    
+    def candidates(self, text: str) -> Set[int]:
+        """Return the ids of rules that may match text"""
+        if self._database is None:
+            return self._all_rules
+        
+        matched: Set[int] = set()
+        
+        def on_match(rule_id, start, end, flags, context):
+            matched.add(rule_id)
+        
+        try:
+            self._database.scan(text.encode(), match_event_handler=on_match)
+        except Exception:
+            return self._all_rules
+        return matched
 
 
 class PIIFilter:
@@ -208,6 +285,29 @@ class PIIMiddleware:
             custom_id = custom_config.get('id')
             if custom_id and custom_id in self.blocked_pii_types:
                 self.pii_types_to_filter.append(custom_id)
+        
+        # Compile detection rules once, in filtering order: built-in types, then custom patterns
+        self._rules: List[Tuple[str, List[Tuple[str, int]]]] = [
+            (pii_type, PIIDetector.patterns_for(pii_type))
+            for pii_type in self.pii_types_to_filter
+            if not pii_type.startswith('pii_custom_')
+        ]
+        for custom_config in self.custom_pii_configs:
+            custom_id = custom_config.get('id')
+            custom_pattern = custom_config.get('pattern')
+            if custom_id in self.pii_types_to_filter and custom_pattern:
+                self._rules.append((custom_id, [(custom_pattern, re.IGNORECASE)]))
+        self._rules = [(pii_type, patterns) for pii_type, patterns in self._rules if patterns]
+        self._compiled_rules: List[Tuple[str, List[Pattern]]] = [
+            (pii_type, [_compile_pattern(pattern, flags) for pattern, flags in patterns])
+            for pii_type, patterns in self._rules
+        ]
+        self._prefilter = PIIPrefilter([patterns for _, patterns in self._rules])
+    
+    @property
+    def has_active_rules(self) -> bool:
+        """Whether any PII type is configured for filtering (otherwise filtering is a no-op)"""
+        return bool(self.pii_types_to_filter)
     
     def filter_text(self, text: str) -> str:
         """
@@ -228,13 +328,14 @@ class PIIMiddleware:
         filtered_text = text
         detected_pii = []
         
-        # Check built-in PII types
-        for pii_type in self.pii_types_to_filter:
-            # Skip custom PII types in this loop
-            if pii_type.startswith('pii_custom_'):
+        # One prefilter pass over the original text decides which rules need a full regex pass
+        candidate_rules = self._prefilter.candidates(text)
+        
+        for rule_id, (pii_type, patterns) in enumerate(self._compiled_rules):
+            if rule_id not in candidate_rules:
                 continue
             
-            matches = PIIDetector.detect(filtered_text, pii_type)
+            matches = PIIDetector.find_all(filtered_text, patterns)
             
             for match in matches:
                 if match:  # Ensure match is not empty
@@ -243,21 +344,6 @@ class PIIMiddleware:
                         filtered_text, match, pii_type, self.default_strategy
                     )
         
-        # Check custom PII patterns
-        for custom_config in self.custom_pii_configs:
-            custom_id = custom_config.get('id')
-            custom_pattern = custom_config.get('pattern')
-            
-            if custom_id in self.pii_types_to_filter and custom_pattern:
-                matches = PIIDetector.detect_with_custom_pattern(filtered_text, custom_pattern)
-                
-                for match in matches:
-                    if match:
-                        detected_pii.append((custom_id, match))
-                        filtered_text = PIIFilter.apply_strategy(
-                            filtered_text, match, custom_id, self.default_strategy
-                        )
-        
         return filtered_text
     
     def process_message(self, message: str, message_type: str = "input") -> str:
@@ -34,6 +34,7 @@ class AgentInDB(AgentBase):
     agent_id: str
     api_key_encrypted: Optional[str] = None
     tenant_id: Optional[str] = None
+    version: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
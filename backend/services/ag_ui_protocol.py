@@ -5,6 +5,7 @@ Based on https://docs.ag-ui.com/
 """
 import json
 import logging
+from utils.json_utils import dumps as json_dumps
 from typing import Dict, Any, Optional, List, Union
 from enum import Enum
 from datetime import datetime
@@ -86,7 +87,7 @@ class AGUIMessage:
     
     def to_json(self) -> str:
         """Convert message to JSON string"""
-        return json.dumps(self.to_dict(), default=str)
+        return json_dumps(self.to_dict(), default=str)
 
 
 class AGUIProtocol:
@@ -1,26 +1,37 @@
+import asyncio
 import uuid
 import json
 import re
 import os
+import random
 import logging
+import traceback
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List, Annotated, Set
-from pydantic import Field, create_model
+from typing import Optional, Dict, Any, List, Annotated, Callable, Sequence, Set, Tuple, TypedDict
+from contextvars import ContextVar, copy_context
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, Field, create_model
 from sqlalchemy.orm import Session
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END, add_messages
 from langgraph.prebuilt import create_react_agent
 from engine.builder import AgentBuilder
 
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import tool
 from langchain_core.language_models import FakeListLLM
+from langchain_core.caches import InMemoryCache
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_groq import ChatGroq
 import hashlib
 import base64
-from cryptography.fernet import Fernet
+import functools
+from cachetools import LRUCache, TTLCache
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
 
 # Import OpenLLMetry decorators for comprehensive tracing
 try:
@@ -51,24 +62,774 @@ logger = logging.getLogger(__name__)
 from services.memory_service import MemoryService
 from services.tools_service import ToolsService
 
-from services.llm_service import LLMService
+from services.llm_service import LLMService, http_client_kwargs
+from services.credentials_service import get_fernet
 from services.rate_limit_handler import RateLimitHandler, RateLimitError
-from services.fastmcp_manager import fastmcp_manager
+from services.prompt_cache import PromptCache
+from services.trace_context import trace_context_manager
+from services.telemetry_service import telemetry_service
+from services.fastmcp_manager import fastmcp_manager, MCPServerConfig
 from middleware.pii_middleware import create_pii_middleware_from_config, PIIMiddleware
 
 from models.agent import Agent as AgentModel
 from models.mcp_server import AgentMCPServer, MCPServer
 from schemas.agent import AgentCreate, AgentInDB
 from core.config import settings
-from sqlalchemy import text
+from utils.json_utils import dumps as json_dumps
+import core.database as database
+from sqlalchemy import insert, select, text
+
+
+# Exact-match response cache attached to the deterministic (temperature 0) clients this service
+# builds, so byte-identical prompts (retries, replays) skip the provider call. It is passed per
+# client rather than installed globally, so LLMs created elsewhere in the process are unaffected.
+_LLM_RESPONSE_CACHE: Optional[InMemoryCache] = (
+    InMemoryCache(maxsize=settings.LLM_CACHE_MAXSIZE) if settings.LLM_CACHE_ENABLED else None
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_ollama_client():
+    """Ollama client for prompt embeddings, created on first use and shared by every call."""
+    from ollama import Client as OllamaClient
+    return OllamaClient(host=settings.OLLAMA_BASE_URL)
+
+
+def _embed_prompt(text: str) -> Optional[List[float]]:
+    """Embed a prompt for the semantic prompt-cache tier using the configured Ollama embedder."""
+    response = _get_ollama_client().embeddings(
+        model=settings.SEMANTIC_CACHE_EMBEDDING_MODEL, prompt=text[:8000]
+    )
+    return response.get("embedding")
+
+
+# Exact (and optionally semantic) cache of full agent responses for temperature-0 executions of
+# agents without tools; a cached answer would otherwise skip (possibly side-effecting) tool calls
+_prompt_cache = PromptCache(
+    maxsize=10000,
+    ttl=3600,
+    similarity_threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    embed_fn=_embed_prompt if settings.SEMANTIC_CACHE_ENABLED else None
+)
+
+
+# API key encryption key, derived from SECRET_KEY once at import instead of per AgentService.
+# In production SECRET_KEY should come from a secure environment variable.
+_ENCRYPTION_KEY = base64.urlsafe_b64encode(hashlib.sha256(
+    settings.SECRET_KEY.encode() if getattr(settings, "SECRET_KEY", None) else b'mech_agent_default_secret_key_32bytes!'
+).digest())
+
+
+@functools.lru_cache(maxsize=256)
+def _decrypt_with_key(key: bytes, encrypted_value: str) -> str:
+    """Decrypt a Fernet token; results are memoized so repeated agent runs skip AES/HMAC work."""
+    return get_fernet(key).decrypt(encrypted_value.encode()).decode()
+
+
+# LLM clients keyed by (provider, model, temperature, API key hash, use_litellm). Each client owns
+# an HTTP connection pool, so agents with the same LLM settings share one and reuse keep-alive
+# connections. The raw API key is never part of the key.
+_LLM_CACHE: LRUCache = LRUCache(maxsize=64)
+
+
+def _api_key_available(api_key: Optional[str]) -> bool:
+    """Whether an API key is set and not just whitespace (without allocating a stripped copy)."""
+    return bool(api_key) and not api_key.isspace()
+
+
+# Dedicated thread pools for blocking calls, so a burst of slow LLM or Mem0 calls cannot starve
+# each other or the default executor used by asyncio.to_thread elsewhere in the process
+_LLM_EXECUTOR = ThreadPoolExecutor(max_workers=settings.LLM_EXECUTOR_MAX_WORKERS, thread_name_prefix="llm")
+_MEMORY_EXECUTOR = ThreadPoolExecutor(max_workers=settings.MEMORY_EXECUTOR_MAX_WORKERS, thread_name_prefix="memory")
+
+
+async def _run_in_executor(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    """Like asyncio.to_thread, on a given executor (context variables are propagated too)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(copy_context().run, func, *args, **kwargs))
+
+
+# Seeded once from os.urandom; generates throwaway ids (tool-call fallbacks) without a urandom read
+# per id. Its output is predictable, so run/session ids and persisted ids keep using uuid.uuid4().
+_ID_RNG = random.Random(os.urandom(32))
+
+
+def _fast_id() -> str:
+    """Random UUID4-formatted identifier for non-persisted, non-security-sensitive ids."""
+    return str(uuid.UUID(int=_ID_RNG.getrandbits(128), version=4))
+
+
+# PII middleware keyed by a hash of the agent's pii_config (None when it has no active rules).
+# The middleware is stateless once built, so agents with equal configs share one instance.
+_PII_MIDDLEWARE_CACHE: LRUCache = LRUCache(maxsize=256)
+
+
+# Every token the LLM error handling looks for, tagged by group name, so one scan of the
+# message classifies it. Provider names mark an error as coming from an LLM provider API.
+_ERROR_TOKEN_RE = re.compile(
+    r"(?P<decommissioned>model_decommissioned|has been decommissioned)"
+    r"|(?P<key>API key|401)"
+    r"|(?P<api_key>(?i:api_key))"
+    r"|(?P<forbidden>403)"
+    r"|(?P<rate>429)"
+    r"|(?P<tool>tool_use_failed|Failed to call a function)"
+    r"|(?P<provider>OpenAI|Anthropic|Groq)"
+)
+_DECOMMISSIONED_MODEL_RE = re.compile(r'model `([^`]+)`')
+_HTML_ERROR_RE = re.compile(r"<!DOCTYPE html>|<html")
+
+# User-facing messages for HTML error pages returned by provider gateways, checked in order
+_HTML_ERROR_MESSAGES = (
+    (("502", "Bad Gateway"), "The AI provider is temporarily unavailable. Please try again."),
+    (("503", "Service Unavailable"), "The AI provider service is temporarily unavailable. Please try again."),
+    (("504", "Gateway Timeout"), "The AI provider request timed out. Please try again."),
+)
+
+
+def _classify_llm_error(error_msg: str) -> frozenset:
+    """Return the error categories an LLM error message falls into.
+    
+    Categories: "decommissioned", "api_key", "forbidden", "rate_limit", "tool".
+    Auth, permission and rate limit categories require the message to come from a provider.
+    """
+    found = {match.lastgroup for match in _ERROR_TOKEN_RE.finditer(error_msg)}
+    from_provider = "provider" in found
+    categories = set()
+    if "decommissioned" in found:
+        categories.add("decommissioned")
+    if "key" in found and (from_provider or "api_key" in found):
+        categories.add("api_key")
+    if from_provider and "forbidden" in found:
+        categories.add("forbidden")
+    if from_provider and "rate" in found:
+        categories.add("rate_limit")
+    if "tool" in found:
+        categories.add("tool")
+    return frozenset(categories)
+
+
+def _clean_html_error(
+    error_msg: str,
+    server_error_message: str = "The AI provider is experiencing server issues. Please try again in a few moments."
+) -> str:
+    """Replace an HTML error page from a provider with a short user-facing message."""
+    if not _HTML_ERROR_RE.search(error_msg):
+        return error_msg
+    if "500" in error_msg and "Internal server error" in error_msg:
+        return server_error_message
+    for tokens, message in _HTML_ERROR_MESSAGES:
+        if any(token in error_msg for token in tokens):
+            return message
+    return "The AI provider returned an error. Please try again."
+
+
+# User-facing messages per error category, in priority order, for chat_with_agent
+# (returned) and agent execution (raised as ValueError)
+_CHAT_ERROR_MESSAGES = {
+    "api_key": "Invalid API key. Please check your API key configuration.",
+    "forbidden": "Access forbidden. Please check your API key permissions.",
+    "rate_limit": "Rate limit exceeded. Please try again later.",
+}
+_EXECUTION_ERROR_MESSAGES = {
+    "api_key": "Invalid API key. Please check your API key configuration.",
+    "forbidden": "Access forbidden. Please check your API key permissions.",
+    # Handle tool execution failures more gracefully
+    "tool": "Tool execution failed. This may be due to rate limiting, network issues, or missing API keys. Please try again or check your tool configuration.",
+}
+
+# Decommissioned-model messages, formatted with the model name from the provider error
+_DECOMMISSIONED_CHAT_MESSAGE = (
+    "⚠️ Model Decommissioned: {model_name} is no longer supported by Groq.\n\n"
+    "📋 Recommended Actions:\n"
+    "1. Edit this agent and change the model to 'llama-3.3-70b-versatile' (recommended) or 'llama-3.1-8b-instant'\n"
+    "2. Save the agent with the new model\n"
+    "3. Try your request again\n\n"
+    "💡 Groq regularly updates their model lineup. See https://console.groq.com/docs/models for currently supported models."
+)
+_DECOMMISSIONED_EXECUTION_MESSAGE = (
+    "Model Decommissioned: {model_name} is no longer supported by Groq. "
+    "Please edit the agent and select a currently supported model like 'llama-3.3-70b-versatile' or 'llama-3.1-8b-instant'. "
+    "See https://console.groq.com/docs/models for the current model list."
+)
+
+
+def _decommissioned_model_name(error_msg: str) -> str:
+    """Extract the model name from a decommissioned-model error."""
+    model_match = _DECOMMISSIONED_MODEL_RE.search(error_msg)
+    return model_match.group(1) if model_match else "the selected model"
+
+
+# Responses of workflow nodes (plan-execute, reflection, custom) keyed by normalized inputs.
+# Only used for deterministic (temperature 0) agents so cached answers match what the LLM would return.
+_NODE_RESPONSE_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=3600)
+
+
+# Nodes whose responses are also persisted on disk (survives restarts), with per-node TTLs in seconds.
+# Analyses depend only on the prompt and input, so they can live much longer than step results.
+_NODE_DISK_CACHE_TTLS = {
+    "analysis": 24 * 3600,
+    "plan_execute": 3600,
+}
+_node_disk_cache = None
+
+
+def _get_node_disk_cache():
+    """Open the disk-backed node response cache on first use; None when disabled or unavailable."""
+    global _node_disk_cache
+    if _node_disk_cache is None and diskcache is not None and settings.NODE_DISK_CACHE_DIR:
+        try:
+            _node_disk_cache = diskcache.Cache(settings.NODE_DISK_CACHE_DIR)
+        except Exception as e:
+            logger.warning(f"Node disk cache unavailable at {settings.NODE_DISK_CACHE_DIR}: {e}")
+    return _node_disk_cache
+
+
+def _normalize_cache_text(value: Any) -> str:
+    """Collapse whitespace runs so inputs differing only in spacing share a cache entry.
+
+    Case and punctuation are kept: "US" and "us", or a question and a statement, are different inputs.
+    """
+    return " ".join(str(value).split())
+
+
+def _node_cache_scope(llm, agent_config) -> Optional[str]:
+    """Identify the LLM for node cache keys; None disables caching for non-deterministic agents."""
+    if getattr(agent_config, "temperature", None) != 0:
+        return None
+    model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    return f"{type(llm).__name__}:{model_name}"
+
+
+async def _invoke_node_llm(llm, prompt: ChatPromptTemplate, values: Dict[str, Any]) -> Any:
+    """Format a node prompt and call the LLM directly, returning stripped text for plain responses."""
+    response = await llm.ainvoke(prompt.format_messages(**values))
+    if isinstance(response, str):
+        return response.strip()
+    if isinstance(response, BaseMessage):
+        return str(response.content).strip()
+    # Structured output (e.g. a Pydantic model) is returned as-is
+    return response
+
+
+# The plan-execute prompt asks for at most this many steps
+_MAX_PLAN_STEPS = 5
+
+# Numbering/bullet a model may put in front of a plan step ("1.", "2)", "-", "*", "•")
+_PLAN_STEP_PREFIX = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+")
+
+
+async def _cached_node_call(cache_scope: Optional[str], node_name: str, node_fingerprint: str, system_prompt: str, llm, prompt: ChatPromptTemplate, values: Dict[str, Any]) -> Any:
+    """Invoke a node's LLM, reusing a previous response for equivalent inputs when caching is enabled.
+    
+    node_fingerprint (see _node_fingerprint) keys responses on the node definition, so entries
+    produced by an older prompt template, output schema or token cap are never served.
+    """
+    if cache_scope is None:
+        return await _invoke_node_llm(llm, prompt, values)
+    
+    key_payload = json.dumps(
+        [cache_scope, node_name, node_fingerprint, system_prompt, {k: _normalize_cache_text(v) for k, v in values.items()}],
+        sort_keys=True
+    )
+    cache_key = hashlib.sha256(key_payload.encode()).hexdigest()
+    cached = _NODE_RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        logger.debug(f"Node response cache hit for {node_name}")
+        return cached
+    
+    disk_ttl = _NODE_DISK_CACHE_TTLS.get(node_name)
+    disk_cache = _get_node_disk_cache() if disk_ttl else None
+    if disk_cache is not None:
+        cached = disk_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Node disk cache hit for {node_name}")
+            _NODE_RESPONSE_CACHE[cache_key] = cached
+            return cached
+    
+    result = await _invoke_node_llm(llm, prompt, values)
+    _NODE_RESPONSE_CACHE[cache_key] = result
+    if disk_cache is not None:
+        disk_cache.set(cache_key, result, expire=disk_ttl)
+    return result
+
+
+# Compiled agent graphs keyed by _agent_graph_key. Building a graph initializes the LLM client
+# and compiles the Pregel executor, so requests for an unchanged agent version reuse the compiled
+# graph. Only tool-free ReAct agents are cached: tool instances carry per-build state (MCP sessions,
+# browsers bound to the event loop that built them) and MCP servers connect while the graph is built.
+_WORKFLOW_GRAPH_CACHE: TTLCache = TTLCache(maxsize=128, ttl=3600)
+_REACT_GRAPH_CACHE: TTLCache = TTLCache(maxsize=128, ttl=300)
+
+
+def _agent_graph_key(agent_config, provider: str, model: str, api_key: Optional[str]) -> Tuple[str, str]:
+    """Key a compiled graph by agent id plus a fingerprint of its version and LLM settings.
+    
+    version and updated_at change on every edit or rollback of the agent; the API key only
+    enters the fingerprint as part of the hash.
+    """
+    key_payload = json.dumps([
+        getattr(agent_config, "version", None),
+        getattr(agent_config, "updated_at", None),
+        agent_config.agent_type,
+        provider,
+        model,
+        agent_config.temperature,
+        agent_config.system_prompt,
+        api_key
+    ], default=str)
+    return agent_config.agent_id, hashlib.sha256(key_payload.encode()).hexdigest()
+
+
+_REACT_TOOL_GUIDANCE = "\n\n## 🛠️ AVAILABLE TOOLS\nUse these tools to perform actions. When a tool is applicable, use it immediately."
+
+
+def _react_system_prompt(base_prompt: str, has_tools: bool) -> Callable[[], str]:
+    """Return a ReAct agent's system prompt builder.
+    
+    The agent's static text (base prompt, tool guidance) is assembled once, when the graph is
+    built; each call only splices in the current request's knowledge and memory context.
+    """
+    tool_guidance = _REACT_TOOL_GUIDANCE if has_tools else ""
+    static_prompt = base_prompt + tool_guidance
+    
+    def system_prompt() -> str:
+        knowledge_context = _request_knowledge_context.get()
+        memory_context = _request_memory_context.get()
+        if not knowledge_context and not memory_context:
+            return static_prompt
+        
+        parts = [base_prompt]
+        if knowledge_context:
+            parts.append(f"\n\n## Knowledge Base Information\n{knowledge_context}")
+            parts.append("\n\n**Note**: This knowledge base contains verified information. Use it for reference.")
+        if memory_context:
+            parts.append(f"\n\n## Context from Previous Conversations\n{memory_context}")
+        parts.append(tool_guidance)
+        return "".join(parts)
+    
+    return system_prompt
+
+
+def _workflow_prompt(human_template: str) -> ChatPromptTemplate:
+    """Parse a workflow node template once, leaving a slot for the agent's system message."""
+    # Keep the default f-string format: LangChain renders jinja2 templates by compiling a
+    # new sandboxed Template on every format call, which is ~25x slower per node call.
+    return ChatPromptTemplate.from_messages([MessagesPlaceholder("system_message"), ("human", human_template)])
+
+
+# Prompts for the plan-execute, reflection and custom workflows, parsed once per process.
+# The human turn only carries per-request fields; the stable system prompt (plus memory) is
+# bound as a separate leading system message so providers can cache the prefix.
+_PLAN_EXECUTE_PROMPT = _workflow_prompt("""Plan up to 5 steps, one actionable line each, then execute step 1; reply briefly (<=100 words).
+Reply with JSON only: {{"plan": [...], "result": ...}}
+Request: {input}
+JSON:""")
+
+_REFLECTION_PROMPT = _workflow_prompt("""Draft an answer, critique it (accuracy, verbosity), then revise it (<=120 words, <=5 bullets).
+Reply with JSON only: {{"draft": ..., "critique": ..., "revision": ...}}
+Request: {input}
+JSON:""")
+
+_ANALYSIS_PROMPT = _workflow_prompt("""Analyze the request in 3-5 bullets.
+Request: {input}
+Analysis:""")
+
+_ACTION_PROMPT = _workflow_prompt("""Choose the best action for the request (<=80 words).
+Request: {input}
+Action:""")
+
+_RESULT_PROMPT = _workflow_prompt("""Answer the request using the analysis and action (<=120 words, <=5 bullets).
+Analysis: {agent_analysis}
+Action: {agent_action}
+Request: {input}
+Answer:""")
+
+
+# Output token caps per workflow node, derived from each prompt's word budget (~1.4 tokens per word)
+_NODE_MAX_TOKENS = {
+    "plan_execute": 360,
+    "reflect": 600,
+    "analysis": 200,
+    "action": 120,
+    "result": 200,
+}
+
+
+def _node_fingerprint(prompt: ChatPromptTemplate, max_tokens: int, output_schema: Optional[type] = None) -> str:
+    """Fingerprint a workflow node definition (prompt template, token cap, structured output schema) for node cache keys."""
+    payload = json.dumps([
+        [
+            (type(message).__name__, getattr(getattr(message, "prompt", None), "template", None))
+            for message in prompt.messages
+        ],
+        max_tokens,
+        output_schema.model_json_schema() if output_schema is not None else None,
+    ], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _limit_tokens(llm, max_tokens: int):
+    """Cap an LLM's output tokens for a workflow node.
+
+    Chat models get a copy with max_tokens set so the cap survives with_structured_output;
+    other LLMs receive it as a bound call argument.
+    """
+    if "max_tokens" in getattr(type(llm), "model_fields", {}):
+        return llm.model_copy(update={"max_tokens": max_tokens})
+    return llm.bind(max_tokens=max_tokens)
+
+
+# Workflow node whose LLM tokens are the user-facing answer when streaming. Plan-execute and
+# reflection nodes produce JSON, so their answer is sent once the graph completes.
+_STREAMED_ANSWER_NODES = {"react": "agent", "plan-execute": None, "reflection": None}
+_DEFAULT_STREAMED_ANSWER_NODE = "result"  # custom agents
+
+
+def _message_chunk_text(content: Any) -> str:
+    """Text of a streamed message chunk (plain string, or Anthropic-style content blocks)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in content
+            if not isinstance(block, dict) or block.get("type") == "text"
+        )
+    return ""
+
+
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def _extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Parse the outermost JSON object embedded in a model's text response, if any."""
+    match = _JSON_OBJECT_RE.search(text)
+    if match:
+        try:
+            parsed = json.loads(match.group(0))
+        except ValueError:
+            return None
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+class PlanExecuteOutput(BaseModel):
+    """Plan and the result of its first step produced by a plan-execute agent in one LLM call."""
+    plan: List[str] = Field(default_factory=list)
+    result: str = ""
+
+
+def _parse_plan_execute_output(output: Any) -> PlanExecuteOutput:
+    """Coerce a structured or plain-text plan-execute response into PlanExecuteOutput.
+
+    Text that is not valid JSON is treated as the step result so a model that
+    ignores the format instructions still produces a usable response.
+    """
+    if isinstance(output, PlanExecuteOutput):
+        return output
+    if not isinstance(output, dict):
+        text_output = str(output or "")
+        output = _extract_json_object(text_output)
+        if output is None:
+            return PlanExecuteOutput(result=text_output)
+    if isinstance(output.get("plan"), str):
+        output = {**output, "plan": [line for line in output["plan"].splitlines() if line.strip()]}
+    try:
+        return PlanExecuteOutput.model_validate(output)
+    except ValueError:
+        return PlanExecuteOutput(result=str(output.get("result") or ""))
+
+
+class ReflectionOutput(BaseModel):
+    """Draft, self-critique and final revision produced by a reflection agent in one LLM call."""
+    draft: str = ""
+    critique: str = ""
+    revision: str = ""
+
+
+def _parse_reflection_output(output: Any) -> ReflectionOutput:
+    """Coerce a structured or plain-text reflection response into ReflectionOutput.
+
+    Text that is not valid JSON is treated as the final answer so a model that
+    ignores the format instructions still produces a usable response.
+    """
+    if isinstance(output, ReflectionOutput):
+        return output
+    if isinstance(output, dict):
+        return ReflectionOutput.model_validate(output)
+    text_output = str(output or "")
+    parsed = _extract_json_object(text_output)
+    if parsed is not None:
+        try:
+            return ReflectionOutput.model_validate(parsed)
+        except ValueError:
+            pass
+    return ReflectionOutput(draft=text_output, revision=text_output)
+
+
+def _supports_cache_control(llm) -> bool:
+    """Whether the LLM accepts Anthropic-style cache_control content blocks."""
+    if isinstance(llm, ChatAnthropic):
+        return True
+    model_name = str(getattr(llm, "model", None) or getattr(llm, "model_name", None) or "")
+    return "claude" in model_name.lower() or model_name.lower().startswith("anthropic/")
+
+
+def _node_prompt(llm, system_prompt: str, prompt: ChatPromptTemplate) -> ChatPromptTemplate:
+    """Build a workflow node prompt with the static system prompt first and dynamic fields last.
+
+    The system prompt is passed as a message rather than a template so it stays
+    byte-identical across calls (OpenAI prefix caching) and is marked as an
+    ephemeral cache breakpoint for Anthropic models.
+    """
+    if _supports_cache_control(llm):
+        system_message = SystemMessage(content=[
+            {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+        ])
+    else:
+        system_message = SystemMessage(content=system_prompt)
+    return prompt.partial(system_message=[system_message])
+
+
+# Memory and knowledge base context for the agent graph executed in the current request/task.
+# Compiled graphs are shared across requests, so per-request context is read from here
+# instead of being baked into the graph; _create_langgraph_agent sets both.
+_request_memory_context: ContextVar[str] = ContextVar("request_memory_context", default="")
+_request_knowledge_context: ContextVar[str] = ContextVar("request_knowledge_context", default="")
+
+
+class _NodePrompts:
+    """System-bound prompt for one workflow node, built once per distinct memory context."""
+    
+    def __init__(self, llm, base_prompt: str, prompt: ChatPromptTemplate):
+        self._llm = llm
+        self._base_prompt = base_prompt
+        self._prompt = prompt
+        self._bound: LRUCache = LRUCache(maxsize=32)
+    
+    def current(self) -> Tuple[str, ChatPromptTemplate]:
+        """Return (system prompt, bound prompt) for the current request's memory context."""
+        memory_context = _request_memory_context.get()
+        entry = self._bound.get(memory_context)
+        if entry is None:
+            system_prompt = _canonicalize_system(self._base_prompt, memory_context)
+            entry = (system_prompt, _node_prompt(self._llm, system_prompt, self._prompt))
+            self._bound[memory_context] = entry
+        return entry
+
+
+def _canonicalize_text(value: str) -> str:
+    """Normalize line endings and strip trailing whitespace so equal content is byte-identical."""
+    lines = value.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def _canonicalize_system(base: str, memory: str = "") -> str:
+    """Assemble an agent's system prompt and memory context into one canonical system message.
+
+    Every workflow builds its system prompt here so whitespace drift never changes the
+    prompt bytes, which would miss provider prefix caches and the node response cache.
+    """
+    parts = [_canonicalize_text(part) for part in (base, memory) if part]
+    return "\n\n".join(part for part in parts if part)
+
+
+def _memory_context_hash(memory_context: str) -> str:
+    """Short, stable fingerprint of a memory context for cache keys and logs."""
+    return hashlib.blake2b(_canonicalize_text(memory_context).encode(), digest_size=16).hexdigest()
+
+
+# Agent table columns that map onto AgentInDB fields (used to build schemas without re-validation)
+_AGENT_SCHEMA_COLUMNS = tuple(
+    column.name for column in AgentModel.__table__.columns
+    if column.name in AgentInDB.model_fields
+)
+
+# Core select of the AgentInDB columns; agent reads fetch plain rows instead of hydrating ORM
+# instances (identity map, instrumented attributes) that are immediately copied into schemas
+_AGENT_SELECT = select(*[AgentModel.__table__.c[name] for name in _AGENT_SCHEMA_COLUMNS])
+
+# Recently loaded agents keyed by (agent_id, tenant_id). A chat turn looks the same agent up
+# several times; entries are dropped on create/update/delete and expire quickly otherwise.
+# Callers get copies, so a caller mutating its agent never changes the cached one.
+_AGENT_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=30)
+
+# Validated agent schemas keyed by (agent_id, version). update_agent bumps the version, so an
+# entry never goes stale; agent listings only re-validate rows that changed since the last poll.
+_AGENT_SCHEMA_CACHE: LRUCache = LRUCache(maxsize=4096)
+
+
+def invalidate_agent_cache(agent_id: str) -> None:
+    """Drop cached lookups and compiled graphs of an agent (for every tenant filter) after it changes."""
+    for cache in (_AGENT_CACHE, _AGENT_SCHEMA_CACHE, _WORKFLOW_GRAPH_CACHE, _REACT_GRAPH_CACHE):
+        for key in [key for key in list(cache.keys()) if key[0] == agent_id]:
+            cache.pop(key, None)
+
+
+# Upper bound on interactions handed to MemoryService.add_memory_bulk in one flush
+_MEMORY_WRITE_BATCH_SIZE = 100
+
+
+class _MemoryWriteQueue:
+    """
+    Background writer for conversation memories.
+    
+    Memory extraction calls an LLM, so chat responses return without waiting for it: interactions
+    are queued with the memory service that produced them and a flusher task on the running event
+    loop drains up to _MEMORY_WRITE_BATCH_SIZE of them at a time into one add_memory_bulk call per
+    memory service on the memory thread pool. drain() flushes what is left at shutdown.
+    """
+    
+    def __init__(self):
+        self._loop = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+    
+    def enqueue(self, memory_service: MemoryService, **interaction) -> None:
+        """Queue an add_memory call; must be called from a running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._flusher is None or self._flusher.done():
+            # Queues and tasks are bound to one event loop
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._flusher = loop.create_task(self._flush_forever(self._queue))
+        self._queue.put_nowait((memory_service, interaction))
+    
+    async def drain(self, timeout: float) -> None:
+        """Wait up to timeout seconds for queued memories to be written, then stop the flusher."""
+        if self._queue is None or self._loop is not asyncio.get_running_loop():
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} queued memories after {timeout}s shutdown drain")
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+    
+    async def _flush_forever(self, queue: asyncio.Queue) -> None:
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < _MEMORY_WRITE_BATCH_SIZE and not queue.empty():
+                batch.append(queue.get_nowait())
+            by_service: Dict[int, Tuple[MemoryService, List[Dict[str, Any]]]] = {}
+            for memory_service, interaction in batch:
+                by_service.setdefault(id(memory_service), (memory_service, []))[1].append(interaction)
+            for memory_service, interactions in by_service.values():
+                try:
+                    await _run_in_executor(_MEMORY_EXECUTOR, memory_service.add_memory_bulk, interactions)
+                except Exception as e:
+                    logger.warning(f"Error storing {len(interactions)} queued memories: {e}")
+            for _ in batch:
+                queue.task_done()
+
+
+_memory_writes = _MemoryWriteQueue()
+
+# Seconds the application waits at shutdown for queued memories to be written
+_MEMORY_WRITE_DRAIN_TIMEOUT = 30.0
+
+
+async def drain_memory_writes(timeout: float = _MEMORY_WRITE_DRAIN_TIMEOUT) -> None:
+    """Write memories still queued from recent chats; called from the application lifespan on shutdown."""
+    await _memory_writes.drain(timeout)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_server_json_fields(
+    server_id: str,
+    updated_at: Optional[datetime],
+    headers_raw: Optional[str],
+    args_raw: Optional[str],
+    env_raw: Optional[str],
+) -> Tuple[Any, Any, Any]:
+    """Decode the JSON-string forms of an MCP server's headers/args/env, once per server revision."""
+    headers = json.loads(headers_raw) if headers_raw else None
+    args = json.loads(args_raw) if args_raw else None
+    env = None
+    if env_raw:
+        try:
+            env = json.loads(env_raw)
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse env JSON for server {server_id}, using empty dict")
+    return headers, args, env
+
+
+def _parsed_server_config(server: MCPServer) -> Tuple[Dict[str, Any], List[Any], Dict[str, Any]]:
+    """
+    Headers, args and env of an MCP server row as Python objects.
+
+    The JSON columns occasionally hold double-encoded strings; those are decoded through an LRU
+    keyed by (server_id, updated_at) so repeated tool loads don't re-parse them. Copies are
+    returned because FastMCP adds auth headers to the dict it is given.
+    """
+    raw = (server.headers, server.args, server.env)
+    parsed = _parse_server_json_fields(
+        server.server_id, server.updated_at, *(value if isinstance(value, str) else None for value in raw)
+    )
+    headers, args, env = (
+        decoded if isinstance(value, str) else value
+        for value, decoded in zip(raw, parsed)
+    )
+    return dict(headers or {}), list(args or []), dict(env or {})
+
+
+def _mcp_server_config(server: MCPServer) -> MCPServerConfig:
+    """FastMCP registration config for an MCP server row."""
+    headers, args, env = _parsed_server_config(server)
+    return MCPServerConfig(
+        server_id=server.server_id,
+        name=server.name,
+        description=server.description or "",
+        transport_type=server.transport_type,
+        url=server.url,
+        headers=headers,
+        auth_type=server.auth_type,
+        auth_token=server.auth_token,
+        command=server.command,
+        args=args,
+        env=env,
+        cwd=server.cwd,
+        status=server.status
+    )
+
+
+def _is_missing_value(value: Any) -> bool:
+    """Whether a required tool argument counts as not provided (None, blank string, empty list)."""
+    if value is None:
+        return True
+    value_type = type(value)
+    if value_type is str:
+        return not value.strip()
+    if value_type is list:
+        return not value
+    # Empty dicts and every other value count as provided
+    return False
+
+
+# Selector accesses that get optional chaining in Puppeteer scripts (see _safeguard_puppeteer_script)
+_PUPPETEER_SELECTOR_PATTERNS = (
+    re.compile(r"(document\.querySelector\([^)]*\))\."),
+    re.compile(r"(document\.querySelectorAll\([^)]*\)\[[^]]+\])\."),
+    re.compile(r"(\.querySelector\([^)]*\))\."),
+    re.compile(r"(\.querySelectorAll\([^)]*\)\[[^]]+\])\."),
+)
+
+# Runs of characters providers reject in tool names (whitespace, punctuation, repeated underscores)
+_TOOL_NAME_INVALID_RUN = re.compile(r"[^0-9A-Za-z]+")
 
 
 class AgentService:
+    # Database URLs whose schema has been checked; the check runs once per database per process
+    _schema_checked_urls: set = set()
+    
     def __init__(self, db: Session):
         self.db = db
         # Generate encryption key from settings or create a default one
         # In production, this should be stored securely
         self._encryption_key = self._get_or_create_encryption_key()
+        self._fernet = get_fernet(self._encryption_key)
         
         # Initialize memory service for mem0 integration
         self.memory_service = MemoryService()
@@ -81,24 +842,32 @@ class AgentService:
         # Initialize LLM service (with LiteLLM support)
         self.llm_service = LLMService()
         
-        # Ensure database schema compatibility (add columns if missing)
-        try:
-            self._ensure_schema()
-        except Exception as e:
-            # Do not fail service init if schema check fails; log and continue
-            print(f"Schema check warning: {e}")
+        # Ensure database schema compatibility (add columns if missing), once per database.
+        # The check uses SQLite PRAGMAs, so other dialects are skipped.
+        bind = self.db.get_bind()
+        bind_url = str(bind.url)
+        if bind_url not in AgentService._schema_checked_urls:
+            if bind.dialect.name == "sqlite":
+                try:
+                    self._ensure_schema()
+                except Exception as e:
+                    # Do not fail service init if schema check fails; log and continue (retried next time)
+                    print(f"Schema check warning: {e}")
+                else:
+                    AgentService._schema_checked_urls.add(bind_url)
+            else:
+                AgentService._schema_checked_urls.add(bind_url)
 
     @staticmethod
     def _safeguard_puppeteer_script(script: str) -> str:
         """Automatically add optional chaining to common DOM selectors to prevent null errors."""
-        if not isinstance(script, str) or not script:
+        if not isinstance(script, str) or "querySelector" not in script:
+            # Every pattern needs a querySelector/querySelectorAll call; skip the regex passes
             return script
 
         updated = script
-        updated = re.sub(r"(document\.querySelector\([^)]*\))\.", r"\1?.", updated)
-        updated = re.sub(r"(document\.querySelectorAll\([^)]*\)\[[^]]+\])\.", r"\1?.", updated)
-        updated = re.sub(r"(\.querySelector\([^)]*\))\.", r"\1?.", updated)
-        updated = re.sub(r"(\.querySelectorAll\([^)]*\)\[[^]]+\])\.", r"\1?.", updated)
+        for pattern in _PUPPETEER_SELECTOR_PATTERNS:
+            updated = pattern.sub(r"\1?.", updated)
 
         return updated
 
@@ -120,27 +889,22 @@ class AgentService:
             return Dict[str, Any]
         return Any
 
-    @staticmethod
-    def _is_missing_value(value: Any) -> bool:
-        if value is None:
-            return True
-        if isinstance(value, str) and not value.strip():
-            return True
-        if isinstance(value, list) and len(value) == 0:
-            return True
-        if isinstance(value, dict) and len(value) == 0:
-            return False  # allow empty dicts by default
-        return False
-
     def _ensure_schema(self):
-        """Ensure required columns exist; add them if missing (SQLite safe)."""
-        # Only run for SQLite-like DBs where PRAGMA is supported; otherwise skip
+        """Ensure required columns exist; add them if missing (SQLite only, see __init__)."""
         try:
             conn = self.db.connection()
             
+            # Columns of both tables in one round-trip (table-valued pragma functions)
+            result = conn.execute(text(
+                "SELECT 'agents', name FROM pragma_table_info('agents') "
+                "UNION ALL SELECT 'agent_mcp_servers', name FROM pragma_table_info('agent_mcp_servers')"
+            )).fetchall()
+            table_columns: Dict[str, Set[str]] = {"agents": set(), "agent_mcp_servers": set()}
+            for table_name, column_name in result:
+                table_columns[table_name].add(column_name)
+            
             # Check agents table columns
-            result = conn.execute(text("PRAGMA table_info(agents)")).fetchall()
-            columns = {row[1] for row in result}
+            columns = table_columns["agents"]
             # Add tool_configs column if missing
             if "tool_configs" not in columns:
                 print("Adding missing 'tool_configs' column to agents table (auto-fix)...")
@@ -151,8 +915,7 @@ class AgentService:
                 conn.execute(text("ALTER TABLE agents ADD COLUMN pii_config JSON"))
             
             # Check agent_mcp_servers table columns
-            result = conn.execute(text("PRAGMA table_info(agent_mcp_servers)")).fetchall()
-            columns = {row[1] for row in result}
+            columns = table_columns["agent_mcp_servers"]
             # Add selected_tools column if missing
             if "selected_tools" not in columns:
                 print("Adding missing 'selected_tools' column to agent_mcp_servers table (auto-fix)...")
@@ -163,20 +926,45 @@ class AgentService:
             raise e
     
     def _get_or_create_encryption_key(self) -> bytes:
-        # In production, this should come from a secure environment variable
-        key_source = settings.SECRET_KEY.encode() if hasattr(settings, 'SECRET_KEY') and settings.SECRET_KEY else b'mech_agent_default_secret_key_32bytes!'
-        # Ensure the key is 32 bytes for Fernet
-        return base64.urlsafe_b64encode(hashlib.sha256(key_source).digest())
+        # Precomputed at import: a 32-byte url-safe key for Fernet derived from SECRET_KEY
+        return _ENCRYPTION_KEY
     
     def _encrypt_api_key(self, api_key: str) -> str:
         """Encrypt API key for storage"""
-        f = Fernet(self._encryption_key)
-        return f.encrypt(api_key.encode()).decode()
+        return self._fernet.encrypt(api_key.encode()).decode()
     
     def _decrypt_api_key(self, encrypted_api_key: str) -> str:
-        """Decrypt API key for use"""
-        f = Fernet(self._encryption_key)
-        return f.decrypt(encrypted_api_key.encode()).decode()
+        """Decrypt API key for use (memoized, since every agent run decrypts the same token)"""
+        return _decrypt_with_key(self._encryption_key, encrypted_api_key)
+    
+    def _agent_api_key(self, agent: AgentInDB) -> Optional[str]:
+        """The agent's own decrypted API key, or None when it has none (or it cannot be decrypted)"""
+        if not getattr(agent, 'api_key_encrypted', None):
+            return None
+        try:
+            return self._decrypt_api_key(agent.api_key_encrypted)
+        except Exception as e:
+            logger.warning("Could not decrypt API key for agent %s: %s", agent.agent_id, e)
+            return None
+    
+    def _get_pii_middleware(self, agent: AgentInDB) -> Optional[PIIMiddleware]:
+        """Return the agent's PII middleware, or None when it has no active filtering rules.
+        
+        Middleware is built once per distinct PII config and shared across requests.
+        """
+        if not agent.pii_config:
+            return None
+        config_key = hashlib.blake2b(
+            json_dumps(agent.pii_config, default=str, sort_keys=True).encode(), digest_size=16
+        ).digest()
+        if config_key in _PII_MIDDLEWARE_CACHE:
+            return _PII_MIDDLEWARE_CACHE[config_key]
+        
+        pii_middleware = create_pii_middleware_from_config(agent.pii_config)
+        if not (pii_middleware and pii_middleware.has_active_rules):
+            pii_middleware = None
+        _PII_MIDDLEWARE_CACHE[config_key] = pii_middleware
+        return pii_middleware
     
     def _sanitize_tool_name(self, name: str, existing_names: Set[str]) -> str:
         """Sanitize tool names to satisfy provider constraints (Groq/OpenAI).
@@ -188,9 +976,14 @@ class AgentService:
         - Are unique within the agent
         """
 
-        sanitized = re.sub(r"\s+", "_", name)
-        sanitized = re.sub(r"[^0-9A-Za-z_]", "_", sanitized)
-        sanitized = re.sub(r"_+", "_", sanitized).strip("_") or "tool"
+        if (
+            name.isascii() and name.replace("_", "").isalnum()
+            and "__" not in name and not name.startswith("_") and not name.endswith("_")
+        ):
+            # Typical MCP names (e.g. browser_navigate) are already valid; skip the regex pass
+            sanitized = name
+        else:
+            sanitized = _TOOL_NAME_INVALID_RUN.sub("_", name).strip("_") or "tool"
 
         if sanitized[0].isdigit():
             sanitized = f"tool_{sanitized}"
@@ -240,60 +1033,113 @@ class AgentService:
         self.db.add(db_agent)
         self.db.commit()
         self.db.refresh(db_agent)
+        invalidate_agent_cache(agent_id)
         print(f"Agent committed to database: {db_agent.agent_id}")
         
         # Handle MCP server associations with tool selection
         # Support both old format (mcp_servers) and new format (mcp_server_configs)
         if agent_data.mcp_server_configs:
             # New format with tool selection
-            for server_config in agent_data.mcp_server_configs:
-                association = AgentMCPServer(
-                    agent_id=agent_id,
-                    server_id=server_config.server_id,
-                    enabled="true",
-                    selected_tools=server_config.selected_tools
-                )
-                self.db.add(association)
+            self._add_mcp_associations(agent_id, [
+                (server_config.server_id, server_config.selected_tools)
+                for server_config in agent_data.mcp_server_configs
+            ])
             self.db.commit()
             print(f"Added {len(agent_data.mcp_server_configs)} MCP server associations with tool selection")
         elif agent_data.mcp_servers:
             # Old format for backward compatibility (all tools)
-            for server_id in agent_data.mcp_servers:
-                association = AgentMCPServer(
-                    agent_id=agent_id,
-                    server_id=server_id,
-                    enabled="true",
-                    selected_tools=None  # None = all tools
-                )
-                self.db.add(association)
+            self._add_mcp_associations(agent_id, [(server_id, None) for server_id in agent_data.mcp_servers])
             self.db.commit()
             print(f"Added {len(agent_data.mcp_servers)} MCP server associations")
         
         return AgentInDB.model_validate(db_agent)
     
+    def _agent_uses_tools(self, agent: AgentInDB) -> bool:
+        """Whether an agent can call tools: configured built-in tools or any enabled MCP server."""
+        if agent.tools:
+            return True
+        return self.db.execute(
+            select(AgentMCPServer.server_id)
+            .where(AgentMCPServer.agent_id == agent.agent_id, AgentMCPServer.enabled == "true")
+            .limit(1)
+        ).first() is not None
+    
+    def _add_mcp_associations(self, agent_id: str, selections: List[Tuple[str, Optional[List[str]]]]) -> None:
+        """
+        Link an agent to MCP servers with one multi-row INSERT (not committed).
+        
+        Args:
+            agent_id: Agent to link
+            selections: (server_id, selected_tools) pairs; selected_tools None means all tools
+        """
+        if not selections:
+            return
+        self.db.execute(insert(AgentMCPServer), [
+            {"agent_id": agent_id, "server_id": server_id, "enabled": "true", "selected_tools": selected_tools}
+            for server_id, selected_tools in selections
+        ])
+    
     async def get_agent(self, agent_id: str, tenant_id: Optional[str] = None) -> Optional[AgentInDB]:
         """Retrieve an agent by ID, optionally filtered by tenant"""
-        query = self.db.query(AgentModel).filter(AgentModel.agent_id == agent_id)
+        cache_key = (agent_id, tenant_id)
+        cached_agent = _AGENT_CACHE.get(cache_key)
+        if cached_agent is not None:
+            return cached_agent.model_copy(deep=True)
+        
+        query = _AGENT_SELECT.where(AgentModel.__table__.c.agent_id == agent_id)
         
         # Apply tenant filter if provided
         if tenant_id:
-            query = query.filter(AgentModel.tenant_id == tenant_id)
-        
-        db_agent = query.first()
-        if db_agent:
-            return AgentInDB.model_validate(db_agent)
+            query = query.where(AgentModel.__table__.c.tenant_id == tenant_id)
+        
+        rows = await self._fetch_mappings(query.limit(1))
+        row = rows[0] if rows else None
+        if row:
+            schema_key = (row["agent_id"], row["version"])
+            agent = _AGENT_SCHEMA_CACHE.get(schema_key)
+            if agent is None:
+                agent = AgentInDB.model_validate(dict(row))
+                _AGENT_SCHEMA_CACHE[schema_key] = agent
+            _AGENT_CACHE[cache_key] = agent
+            return agent.model_copy(deep=True)
         return None
 
     async def get_agents(self, tenant_id: Optional[str] = None) -> List[AgentInDB]:
         """Retrieve all agents, optionally filtered by tenant"""
-        query = self.db.query(AgentModel)
+        query = _AGENT_SELECT
         
         # Apply tenant filter if provided
         if tenant_id:
-            query = query.filter(AgentModel.tenant_id == tenant_id)
+            query = query.where(AgentModel.__table__.c.tenant_id == tenant_id)
+        
+        rows = await self._fetch_mappings(query)
+        agents = []
+        for row in rows:
+            schema_key = (row["agent_id"], row["version"])
+            agent = _AGENT_SCHEMA_CACHE.get(schema_key)
+            if agent is None:
+                agent = AgentInDB.model_validate(dict(row))
+                _AGENT_SCHEMA_CACHE[schema_key] = agent
+            agents.append(agent.model_copy(deep=True))
+        return agents
+    
+    async def _fetch_mappings(self, query) -> list:
+        """Run a read-only Core query and return its rows as mappings.
         
-        db_agents = query.all()
-        return [AgentInDB.model_validate(agent) for agent in db_agents]
+        Awaited on the async engine when it serves the same database as this service's session,
+        so agent lookups do not block the event loop; otherwise runs on the sync session.
+        """
+        if database.AsyncSessionLocal is not None and self.db.get_bind().url == database.engine.url:
+            try:
+                async with database.AsyncSessionLocal() as session:
+                    result = await session.execute(query)
+                    return result.mappings().all()
+            except Exception as e:
+                # e.g. connection arguments the asyncio driver does not accept; don't pay for the
+                # failing attempt on every read, use the sync session for the rest of the process
+                logger.warning(f"Async agent query failed, using the sync session from now on: {e}")
+                database.AsyncSessionLocal = None
+        return self.db.execute(query).mappings().all()
     
     async def count_agents(self, tenant_id: Optional[str] = None) -> int:
         """Count total agents, optionally filtered by tenant"""
@@ -317,82 +1163,81 @@ class AgentService:
         if db_agent:
             self.db.delete(db_agent)
             self.db.commit()
+            invalidate_agent_cache(agent_id)
             return True
         return False
     
+    async def _auto_connect_mcp_server(self, server: MCPServer) -> None:
+        """Register and connect an inactive MCP server, recording the outcome on the row (not committed)."""
+        logger.info(f"MCP server {server.name} is {server.status}. Attempting auto-connect...")
+        try:
+            # Register server if not already registered
+            if server.server_id not in fastmcp_manager.servers:
+                await fastmcp_manager.register_server(_mcp_server_config(server))
+            
+            # Attempt connection
+            success = await fastmcp_manager.connect_server(server.server_id)
+            if success:
+                server.status = "active"
+                server.last_connected = datetime.now(timezone.utc)
+                server.last_error = None
+                logger.info(f"✅ Successfully auto-connected MCP server {server.name}")
+            else:
+                logger.warning(f"⚠️ Failed to auto-connect MCP server {server.name}. Server will be skipped.")
+                server.status = "error"
+                server.last_error = "Auto-connect failed"
+        except Exception as e:
+            logger.error(f"Error auto-connecting MCP server {server.name}: {e}")
+            server.status = "error"
+            server.last_error = str(e)
+    
+    async def _discover_mcp_server_tools(self, server: MCPServer) -> List[Dict[str, Any]]:
+        """Fetch an active MCP server's tools, re-registering it with FastMCP first if needed."""
+        server_id = server.server_id
+        # Ensure server is registered with FastMCP manager (in case backend restarted)
+        if server_id not in fastmcp_manager.servers:
+            logger.info(f"Re-registering MCP server {server.name} with FastMCP manager from DB")
+            await fastmcp_manager.register_server(_mcp_server_config(server))
+            
+            # Connect to the server to discover tools
+            logger.info(f"Connecting to MCP server {server.name} to discover tools")
+            await fastmcp_manager.connect_server(server_id)
+        
+        # Get tools from FastMCP manager
+        return await fastmcp_manager.get_tools(server_id)
+    
     async def get_agent_mcp_tools(self, agent_id: str) -> List[Dict[str, Any]]:
         """
         Load MCP tools for an agent from associated MCP servers.
         Returns a list of LangChain tools that can be used by the agent.
         """
         try:
-            # Get MCP server associations for this agent
-            associations = self.db.query(AgentMCPServer).filter(
-                AgentMCPServer.agent_id == agent_id,
-                AgentMCPServer.enabled == "true"
+            # Get the agent's enabled MCP servers (active or inactive - we'll try to connect inactive ones)
+            # together with each association's selected_tools, in one query
+            rows = self.db.execute(
+                select(MCPServer, AgentMCPServer.selected_tools)
+                .join(AgentMCPServer, AgentMCPServer.server_id == MCPServer.server_id)
+                .where(AgentMCPServer.agent_id == agent_id, AgentMCPServer.enabled == "true")
             ).all()
             
-            if not associations:
+            if not rows:
                 return []
             
-            # Create a mapping of server_id to association (for selected_tools lookup)
-            server_associations = {assoc.server_id: assoc for assoc in associations}
-            
-            # Get server IDs
-            server_ids = [assoc.server_id for assoc in associations]
-            
-            # Get MCP servers (active or inactive - we'll try to connect inactive ones)
-            servers = self.db.query(MCPServer).filter(
-                MCPServer.server_id.in_(server_ids)
-            ).all()
-            
-            if not servers:
-                logger.warning(f"No MCP servers found in database for agent {agent_id}. Agent associations exist but servers are missing.")
-                return []
-            
-            # Auto-connect inactive servers
-            for server in servers:
-                if server.status != "active":
-                    logger.info(f"MCP server {server.name} is {server.status}. Attempting auto-connect...")
-                    try:
-                        # Register server if not already registered
-                        if server.server_id not in fastmcp_manager.servers:
-                            from services.fastmcp_manager import MCPServerConfig
-                            config = MCPServerConfig(
-                                server_id=server.server_id,
-                                name=server.name,
-                                description=server.description or "",
-                                transport_type=server.transport_type,
-                                url=server.url,
-                                headers=server.headers or {},
-                                auth_type=server.auth_type,
-                                auth_token=server.auth_token,
-                                command=server.command,
-                                args=server.args or [],
-                                env=server.env or {},
-                                cwd=server.cwd,
-                                status=server.status
-                            )
-                            await fastmcp_manager.register_server(config)
-                        
-                        # Attempt connection
-                        success = await fastmcp_manager.connect_server(server.server_id)
-                        if success:
-                            server.status = "active"
-                            server.last_connected = datetime.now(timezone.utc)
-                            server.last_error = None
-                            self.db.commit()
-                            logger.info(f"✅ Successfully auto-connected MCP server {server.name}")
-                        else:
-                            logger.warning(f"⚠️ Failed to auto-connect MCP server {server.name}. Server will be skipped.")
-                            server.status = "error"
-                            server.last_error = "Auto-connect failed"
-                            self.db.commit()
-                    except Exception as e:
-                        logger.error(f"Error auto-connecting MCP server {server.name}: {e}")
-                        server.status = "error"
-                        server.last_error = str(e)
-                        self.db.commit()
+            # Servers, their associations' selected_tools, and whether the user has manually
+            # selected tools anywhere (if so, respect their selection), in one pass over the rows
+            servers = []
+            server_selected_tools = {}
+            has_selected_tools = False
+            for server, selected in rows:
+                servers.append(server)
+                server_selected_tools[server.server_id] = selected
+                has_selected_tools = has_selected_tools or selected is not None
+            
+            # Auto-connect inactive servers concurrently; status changes are committed together
+            inactive_servers = [server for server in servers if server.status != "active"]
+            if inactive_servers:
+                await asyncio.gather(*(self._auto_connect_mcp_server(server) for server in inactive_servers))
+                self.db.commit()
             
             # Filter to only active servers after connection attempts
             active_servers = [s for s in servers if s.status == "active"]
@@ -403,63 +1248,29 @@ class AgentService:
             
             logger.info(f"Agent {agent_id} has {len(active_servers)} active MCP servers: {[s.name for s in active_servers]}")
             
-            # Collect tools from all active MCP servers
+            # Discover tools from all active MCP servers concurrently
+            tool_lists = await asyncio.gather(
+                *(self._discover_mcp_server_tools(server) for server in active_servers),
+                return_exceptions=True
+            )
+            
+            # Limit total number of MCP tools to prevent token overflow
+            # Only apply this limit if user hasn't manually selected specific tools
+            # Large numbers of tools cause 413 Payload Too Large errors with LLMs
+            max_tools = settings.MAX_MCP_TOOLS_PER_AGENT
+            tool_cap = max_tools if max_tools > 0 and not has_selected_tools else None
+            trimmed_tool_names: List[str] = []
+            
+            # Collect tools in server order
             mcp_tools = []
             existing_tool_names: Set[str] = set()
-            for server in active_servers:
+            for server, tools in zip(active_servers, tool_lists):
+                if isinstance(tools, Exception):
+                    logger.error(f"Error loading tools from MCP server {server.name}: {tools}")
+                    continue
                 try:
-                    # Ensure server is registered with FastMCP manager (in case backend restarted)
-                    if server.server_id not in fastmcp_manager.servers:
-                        logger.info(f"Re-registering MCP server {server.name} with FastMCP manager from DB")
-                        from services.fastmcp_manager import MCPServerConfig
-
-                        headers = server.headers
-                        if isinstance(headers, str) and headers:
-                            headers = json.loads(headers)
-                        headers = headers or {}
-
-                        args = server.args
-                        if isinstance(args, str) and args:
-                            args = json.loads(args)
-                        args = args or []
-
-                        env = server.env
-                        env = server.env
-                        if isinstance(env, str) and env:
-                            try:
-                                env = json.loads(env)
-                            except json.JSONDecodeError:
-                                logger.warning(f"Failed to parse env JSON for server {server.name}, using empty dict")
-                                env = {}
-                        env = env or {}
-
-                        config = MCPServerConfig(
-                            server_id=server.server_id,
-                            name=server.name,
-                            description=server.description or "",
-                            transport_type=server.transport_type,
-                            url=server.url,
-                            headers=headers,
-                            auth_type=server.auth_type,
-                            auth_token=server.auth_token,
-                            command=server.command,
-                            args=args,
-                            env=env,
-                            cwd=server.cwd,
-                            status=server.status
-                        )
-                        await fastmcp_manager.register_server(config)
-                        
-                        # Connect to the server to discover tools
-                        logger.info(f"Connecting to MCP server {server.name} to discover tools")
-                        await fastmcp_manager.connect_server(server.server_id)
-                    
-                    # Get tools from FastMCP manager
-                    tools = await fastmcp_manager.get_tools(server.server_id)
-                    
                     # Get selected_tools for this server (if user has specified)
-                    association = server_associations.get(server.server_id)
-                    selected_tools = association.selected_tools if association and association.selected_tools else None
+                    selected_tools = server_selected_tools.get(server.server_id) or None
                     
                     # FIX: Handle selected_tools as JSON string (SQLAlchemy might return string instead of list)
                     if selected_tools and isinstance(selected_tools, str):
@@ -469,7 +1280,7 @@ class AgentService:
                         except json.JSONDecodeError as e:
                             logger.warning(
                                 f"selected_tools is a string but not valid JSON for server {server.name}. "
-                                f"Value: {association.selected_tools}. Error: {e}"
+                                f"Value: {selected_tools}. Error: {e}"
                             )
                             selected_tools = None
                     
@@ -480,12 +1291,20 @@ class AgentService:
                     if selected_tools:
                         # Only load tools that were selected by the user
                         original_count = len(tools)
-                        tools = [t for t in tools if t.get("name") in selected_tools]
+                        selected_set = frozenset(selected_tools)
+                        tools = [t for t in tools if t.get("name") in selected_set]
                         logger.info(f"Filtered from {original_count} to {len(tools)} selected tools from MCP server {server.name}")
                     else:
                         # Load all tools from the server
                         logger.info(f"No tool filtering - loading all {len(tools)} tools from MCP server {server.name}")
                     
+                    if tool_cap is not None and len(mcp_tools) + len(tools) > tool_cap:
+                        # Past the cap: keep only the names of the rest for the warning below
+                        remaining = max(tool_cap - len(mcp_tools), 0)
+                        # MCP tools are dicts, not objects - use dict access
+                        trimmed_tool_names.extend(t.get("name", "unknown") for t in tools[remaining:])
+                        tools = tools[:remaining]
+                    
                     # Add raw MCP tools to list (no conversion)
                     for tool_info in tools:
                         # Inject server_id so the executor knows where to route the call
@@ -498,34 +1317,14 @@ class AgentService:
                     logger.error(f"Error loading tools from MCP server {server.name}: {e}")
                     continue
             
-            # Check if user has manually selected tools (if so, respect their selection)
-            has_selected_tools = any(
-                assoc.selected_tools is not None 
-                for assoc in associations
-            )
-            
-            # Limit total number of MCP tools to prevent token overflow
-            # Only apply this limit if user hasn't manually selected specific tools
-            # Large numbers of tools cause 413 Payload Too Large errors with LLMs
-            max_tools = settings.MAX_MCP_TOOLS_PER_AGENT
-            
             if max_tools > 0:
-                if not has_selected_tools and len(mcp_tools) > max_tools:
-                    # MCP tools are dicts, not objects - use dict access
-                    trimmed_tool_names = [t.get("name", "unknown") for t in mcp_tools[max_tools:]]
+                if trimmed_tool_names:
                     logger.warning(
-                        f"⚠️  Agent {agent_id} has {len(mcp_tools)} MCP tools, which exceeds the limit of {max_tools}. "
+                        f"⚠️  Agent {agent_id} has {len(mcp_tools) + len(trimmed_tool_names)} MCP tools, which exceeds the limit of {max_tools}. "
                         f"Trimming to first {max_tools} tools to prevent token overflow. "
                         f"Trimmed tools: {trimmed_tool_names}. "
                         f"To avoid this, select specific tools for each MCP server, or set MAX_MCP_TOOLS_PER_AGENT in .env file."
                     )
-                    print(
-                        f"⚠️  WARNING: Too many MCP tools ({len(mcp_tools)})! Limiting to {max_tools} tools to prevent API errors. "
-                        f"Trimmed tools: {', '.join(trimmed_tool_names[:5])}{'...' if len(trimmed_tool_names) > 5 else ''}. "
-                        f"Use the tool selection feature to choose specific tools instead of loading all tools from MCP servers."
-                    )
-                    # Keep only the first N tools
-                    mcp_tools = mcp_tools[:max_tools]
                 elif has_selected_tools and len(mcp_tools) > max_tools:
                     logger.warning(
                         f"⚠️  Agent {agent_id} has {len(mcp_tools)} selected tools, which exceeds the recommended limit of {max_tools}. "
@@ -572,48 +1371,33 @@ class AgentService:
         db_agent.pii_config = agent_data.pii_config
         db_agent.version = (db_agent.version or 1) + 1  # Increment version
         
-        self.db.commit()
-        self.db.refresh(db_agent)
-        print(f"Agent updated in database: {db_agent.agent_id}")
-        
         # Update MCP server associations with tool selection
         # Support both old format (mcp_servers) and new format (mcp_server_configs)
         if agent_data.mcp_server_configs is not None:
             # New format with tool selection
-            # Remove existing associations
-            self.db.query(AgentMCPServer).filter(
-                AgentMCPServer.agent_id == agent_id
-            ).delete()
-            
-            # Add new associations with tool selection
-            for server_config in agent_data.mcp_server_configs:
-                association = AgentMCPServer(
-                    agent_id=agent_id,
-                    server_id=server_config.server_id,
-                    enabled="true",
-                    selected_tools=server_config.selected_tools
-                )
-                self.db.add(association)
-            self.db.commit()
-            print(f"Updated MCP server associations with tool selection: {len(agent_data.mcp_server_configs)} servers")
+            selections = [
+                (server_config.server_id, server_config.selected_tools)
+                for server_config in agent_data.mcp_server_configs
+            ]
         elif agent_data.mcp_servers is not None:
-            # Old format for backward compatibility
-            # Remove existing associations
+            # Old format for backward compatibility (all tools)
+            selections = [(server_id, None) for server_id in agent_data.mcp_servers]
+        else:
+            selections = None
+        
+        if selections is not None:
+            # Replace existing associations in the same transaction as the agent fields
             self.db.query(AgentMCPServer).filter(
                 AgentMCPServer.agent_id == agent_id
             ).delete()
-            
-            # Add new associations (all tools)
-            for server_id in agent_data.mcp_servers:
-                association = AgentMCPServer(
-                    agent_id=agent_id,
-                    server_id=server_id,
-                    enabled="true",
-                    selected_tools=None  # None = all tools
-                )
-                self.db.add(association)
-            self.db.commit()
-            print(f"Updated MCP server associations: {len(agent_data.mcp_servers)} servers")
+            self._add_mcp_associations(agent_id, selections)
+        
+        self.db.commit()
+        self.db.refresh(db_agent)
+        invalidate_agent_cache(agent_id)
+        print(f"Agent updated in database: {db_agent.agent_id}")
+        if selections is not None:
+            print(f"Updated MCP server associations: {len(selections)} servers")
         
         return AgentInDB.model_validate(db_agent)
 
@@ -630,93 +1414,60 @@ class AgentService:
             
             # Apply PII filtering to input if configured
             filtered_message = message
-            if agent.pii_config:
-                pii_middleware = create_pii_middleware_from_config(agent.pii_config)
-                if pii_middleware:
-                    filtered_message = pii_middleware.process_message(message, message_type="input")
+            pii_middleware = self._get_pii_middleware(agent)
+            if pii_middleware:
+                filtered_message = pii_middleware.process_message(message, message_type="input")
             
             # Execute the agent and get response
-            response = await self.execute_agent(agent_id, filtered_message, session_id=session_id)
+            response = await self.execute_agent(agent_id, filtered_message, session_id=session_id, pre_filtered=True)
             
             # Apply PII filtering to output if configured
-            if agent.pii_config:
-                pii_middleware = create_pii_middleware_from_config(agent.pii_config)
-                if pii_middleware:
-                    response = pii_middleware.process_message(response, message_type="output")
+            if pii_middleware:
+                response = pii_middleware.process_message(response, message_type="output")
             
             # Store the interaction in mem0 memory if enabled
             # Store both user and assistant messages to preserve conversation context
             if self.memory_service.is_enabled():
                 try:
-                    # Get agent to access its LLM configuration
-                    agent = await self.get_agent(agent_id)
-                    if agent:
-                        # Store both messages for full conversational context
-                        # Mem0 is configured to extract user-specific facts
-                        interaction = [
-                            {"role": "user", "content": message},
-                            {"role": "assistant", "content": response}
-                        ]
-                        self.memory_service.add_memory(
-                            interaction, 
-                            user_id=session_id, 
-                            agent_id=agent_id,
-                            llm_provider="groq",
-                            llm_model="llama-3.1-8b-instant"
-                        )
+                    # Store both messages for full conversational context
+                    # Mem0 is configured to extract user-specific facts
+                    interaction = [
+                        {"role": "user", "content": message},
+                        {"role": "assistant", "content": response}
+                    ]
+                    # Written in the background so the response is not held up by extraction
+                    _memory_writes.enqueue(
+                        self.memory_service,
+                        messages=interaction,
+                        user_id=session_id,
+                        agent_id=agent_id,
+                        llm_provider="groq",
+                        llm_model="llama-3.1-8b-instant"
+                    )
                 except Exception as mem_error:
-                    print(f"Error storing memory: {mem_error}")
+                    logger.error("Error storing memory: %s", mem_error)
             
             return response
         except Exception as e:
             # Log the error for debugging
-            error_msg = str(e)
+            error_msg = _clean_html_error(str(e))
             
-            # Clean HTML error responses
-            if "<!DOCTYPE html>" in error_msg or "<html" in error_msg:
-                if "500" in error_msg and "Internal server error" in error_msg:
-                    error_msg = "The AI provider is experiencing server issues. Please try again in a few moments."
-                elif "502" in error_msg or "Bad Gateway" in error_msg:
-                    error_msg = "The AI provider is temporarily unavailable. Please try again."
-                elif "503" in error_msg or "Service Unavailable" in error_msg:
-                    error_msg = "The AI provider service is temporarily unavailable. Please try again."
-                elif "504" in error_msg or "Gateway Timeout" in error_msg:
-                    error_msg = "The AI provider request timed out. Please try again."
-                else:
-                    error_msg = "The AI provider returned an error. Please try again."
-            
-            print(f"Error chatting with agent {agent_id}: {error_msg}")
+            logger.error("Error chatting with agent %s: %s", agent_id, error_msg)
             
             # Return a more user-friendly error message
+            categories = _classify_llm_error(error_msg)
             # Check for decommissioned model errors (Groq)
-            if "model_decommissioned" in error_msg or "has been decommissioned" in error_msg:
-                # Extract model name if possible
-                import re
-                model_match = re.search(r'model `([^`]+)`', error_msg)
-                model_name = model_match.group(1) if model_match else "the selected model"
-                
-                return (
-                    f"⚠️ Model Decommissioned: {model_name} is no longer supported by Groq.\n\n"
-                    f"📋 Recommended Actions:\n"
-                    f"1. Edit this agent and change the model to 'llama-3.3-70b-versatile' (recommended) or 'llama-3.1-8b-instant'\n"
-                    f"2. Save the agent with the new model\n"
-                    f"3. Try your request again\n\n"
-                    f"💡 Groq regularly updates their model lineup. See https://console.groq.com/docs/models for currently supported models."
-                )
-            # Check for specific API key errors from LLM providers
-            elif (("API key" in error_msg or "401" in error_msg) and 
-                ("OpenAI" in error_msg or "Anthropic" in error_msg or "Groq" in error_msg or "api_key" in error_msg.lower())):
-                return "Invalid API key. Please check your API key configuration."
-            elif "403" in error_msg and ("OpenAI" in error_msg or "Anthropic" in error_msg or "Groq" in error_msg):
-                return "Access forbidden. Please check your API key permissions."
-            elif "429" in error_msg and ("OpenAI" in error_msg or "Anthropic" in error_msg or "Groq" in error_msg):
-                return "Rate limit exceeded. Please try again later."
-            else:
-                return f"Error communicating with the agent: {error_msg}"
+            if "decommissioned" in categories:
+                return _DECOMMISSIONED_CHAT_MESSAGE.format(model_name=_decommissioned_model_name(error_msg))
+            for category, message in _CHAT_ERROR_MESSAGES.items():
+                if category in categories:
+                    return message
+            return f"Error communicating with the agent: {error_msg}"
     
     @workflow(name="agent_execution")
     async def execute_agent(self, agent_id: str, input_text: str, session_id: Optional[str] = None, 
-                            workflow_id: Optional[str] = None, workflow_execution_id: Optional[str] = None) -> str:
+                            workflow_id: Optional[str] = None, workflow_execution_id: Optional[str] = None,
+                            pre_filtered: bool = False) -> str:
         """
         Execute an agent with automatic rate limit handling.
         
@@ -726,6 +1477,7 @@ class AgentService:
         Args:
             workflow_id: Optional workflow ID if this agent is being executed as part of a workflow
             workflow_execution_id: Optional workflow execution ID for tracing
+            pre_filtered: True if the caller already applied the agent's input PII filtering
         """
         agent = await self.get_agent(agent_id)
         if not agent:
@@ -736,7 +1488,7 @@ class AgentService:
         logger.info(f"🔄 Using recursion limit from agent config: {recursion_limit}")
         
         # Check if rate limit fallback is enabled (can be disabled via env var)
-        enable_rate_limit_fallback = os.getenv("ENABLE_RATE_LIMIT_FALLBACK", "true").lower() == "true"
+        enable_rate_limit_fallback = settings.ENABLE_RATE_LIMIT_FALLBACK
         
         # Track original configuration for fallback
         # IMPORTANT: Use separate variables instead of modifying agent object
@@ -750,20 +1502,27 @@ class AgentService:
         retry_count = 0
         last_provider_tried = None
         
-        # Apply PII filtering to input if configured
+        # Don't spend the first attempt on a model this agent's API key is still cooling down on.
+        # Cooldowns are per key, and the provider is only switched after this agent's own call hits a 429.
+        key_scope = RateLimitHandler.api_key_scope(self._agent_api_key(agent))
+        if enable_rate_limit_fallback:
+            current_model = RateLimitHandler.resolve_available_model(current_provider, current_model, key_scope)
+            if current_model != original_model:
+                logger.info(
+                    "⏭️ %s/%s is rate-limited for this API key, starting with %s",
+                    original_provider, original_model, current_model
+                )
+        
+        # Apply PII filtering to input if configured (and not already done by the caller)
         filtered_input = input_text
-        if agent.pii_config:
-            pii_middleware = create_pii_middleware_from_config(agent.pii_config)
-            if pii_middleware:
-                filtered_input = pii_middleware.process_message(input_text, message_type="input")
+        pii_middleware = None if pre_filtered else self._get_pii_middleware(agent)
+        if pii_middleware:
+            filtered_input = pii_middleware.process_message(input_text, message_type="input")
         
         # Add telemetry context for trace enrichment
         # Use Traceloop's decorator to create proper traced execution
         agent_span = None
         try:
-            from services.trace_context import trace_context_manager
-            from services.telemetry_service import telemetry_service
-            
             # Get current trace ID to register in context manager (Strategy 2 for SQLite exporter)
             span = telemetry_service.get_current_span()
             trace_id = None
@@ -804,19 +1563,19 @@ class AgentService:
         return await self._execute_retry_loop(
             agent, filtered_input, session_id, agent_id,
             retry_count, max_retries, current_provider, current_model,
-            enable_rate_limit_fallback, last_provider_tried
+            enable_rate_limit_fallback, last_provider_tried, key_scope
         )
     
     async def _execute_retry_loop(
         self, agent, filtered_input, session_id, agent_id,
         retry_count, max_retries, current_provider, current_model,
-        enable_rate_limit_fallback, last_provider_tried
+        enable_rate_limit_fallback, last_provider_tried, key_scope=None
     ):
         """Extracted retry loop to allow span context wrapping"""
         # Retry loop with fallback support
         while retry_count < max_retries:
             try:
-                return await self._execute_agent_with_fallback(
+                result = await self._execute_agent_with_fallback(
                     agent=agent,
                     filtered_input=filtered_input,
                     session_id=session_id,
@@ -824,21 +1583,24 @@ class AgentService:
                     override_provider=current_provider,
                     override_model=current_model
                 )
+                RateLimitHandler.record_outcome(current_provider, current_model, success=True)
+                return result
             except Exception as e:
                 error_msg = str(e)
                 
                 # IMPORTANT: Only treat as rate limit if it's actually a rate limit error
                 # Exclude tool errors, validation errors, and decommissioned model errors
-                is_tool_error = "tool" in error_msg.lower() and ("validation" in error_msg.lower() or "execution" in error_msg.lower())
-                is_decommissioned_error = "decommissioned" in error_msg.lower() or "model_decommissioned" in error_msg.lower()
+                error_lower = error_msg.lower()
+                is_tool_error = "tool" in error_lower and ("validation" in error_lower or "execution" in error_lower)
+                is_decommissioned_error = "decommissioned" in error_lower
                 
                 # Check if it's a rate limit error (but not a tool or model error) and fallback is enabled
                 if enable_rate_limit_fallback and RateLimitHandler.is_rate_limit_error(error_msg) and not is_tool_error and not is_decommissioned_error:
                     retry_count += 1
                     provider = RateLimitHandler.extract_provider(error_msg) or current_provider
+                    RateLimitHandler.record_outcome(provider, current_model, success=False)
                     
-                    logger.warning(f"⚠️ Rate limit hit on {provider}/{current_model} (attempt {retry_count}/{max_retries})")
-                    print(f"⚠️ Rate limit hit on {provider}/{current_model} (attempt {retry_count}/{max_retries})")
+                    logger.warning("⚠️ Rate limit hit on %s/%s (attempt %s/%s)", provider, current_model, retry_count, max_retries)
                     
                     # Extract and cache the rate limit with wait time
                     wait_time = RateLimitHandler.extract_wait_time(error_msg)
@@ -847,6 +1609,9 @@ class AgentService:
                         current_model,
                         wait_time if wait_time else 300  # Default 5 minutes
                     )
+                    if key_scope:
+                        # Lets later runs with the same key skip this model before their first attempt
+                        RateLimitHandler.cache_rate_limit(provider, current_model, wait_time if wait_time else 300, key_scope)
                     
                     if retry_count >= max_retries:
                         # Check how many models are still available
@@ -864,13 +1629,12 @@ class AgentService:
                         # Found available model in same provider
                         # DO NOT modify agent object - use local variables instead
                         current_model = fallback_model
-                        logger.info(f"🔄 Attempt {retry_count}: Switching to {provider}/{fallback_model}")
-                        print(f"🔄 Attempt {retry_count}: Switching to {provider}/{fallback_model}")
+                        logger.info("🔄 Attempt %s: Switching to %s/%s", retry_count, provider, fallback_model)
                         continue
                     
                     # Strategy 2: All models in current provider are rate-limited, try alternative provider
-                    logger.warning(f"⚠️ All models in {provider} appear rate-limited or exhausted")
-                    print(f"⚠️ All models in {provider} appear rate-limited or exhausted")
+                    logger.warning("⚠️ All models in %s appear rate-limited or exhausted", provider)
+                    RateLimitHandler.cache_provider_rate_limit(provider, wait_time if wait_time else 300)
                     
                     alt_provider = RateLimitHandler.get_alternative_provider(provider)
                     if alt_provider:
@@ -880,14 +1644,12 @@ class AgentService:
                             # DO NOT modify agent object - use local variables instead
                             current_provider = alt_provider
                             current_model = alt_models[0]
-                            logger.info(f"🔄 Attempt {retry_count}: Switching provider to {alt_provider}/{alt_models[0]}")
-                            print(f"🔄 Attempt {retry_count}: Switching provider to {alt_provider}/{alt_models[0]}")
+                            logger.info("🔄 Attempt %s: Switching provider to %s/%s", retry_count, alt_provider, alt_models[0])
                             last_provider_tried = alt_provider
                             continue
                     
                     # Strategy 3: No fallbacks available
                     logger.error("❌ No more fallback models or providers available")
-                    print("❌ No more fallback models or providers available")
                     
                     # Build helpful error message
                     groq_available = len(RateLimitHandler.get_all_available_models("groq"))
@@ -951,11 +1713,14 @@ class AgentService:
             # Get recursion limit from agent config (single source of truth)
             recursion_limit = agent.recursion_limit if hasattr(agent, 'recursion_limit') and agent.recursion_limit else 50
             
-            # Retrieve relevant memories from mem0 if enabled
-            memory_context = ""
-            if self.memory_service.is_enabled():
+            # Retrieve relevant memories from mem0 (on the memory pool, the client is blocking)
+            async def retrieve_memory_context() -> str:
+                if not self.memory_service.is_enabled():
+                    return ""
                 try:
-                    memories = self.memory_service.search_memory(
+                    memories = await _run_in_executor(
+                        _MEMORY_EXECUTOR,
+                        self.memory_service.search_memory,
                         query=filtered_input,
                         user_id=user_id,
                         agent_id=agent.agent_id,
@@ -963,37 +1728,64 @@ class AgentService:
                         llm_provider="groq",
                         llm_model="llama-3.1-8b-instant"
                     )
-                    
-                    # Build memory context string
-                    if memories:
-                        memory_context = "\nRelevant information from previous conversations:\n"
-                        for i, memory in enumerate(memories, 1):
-                            memory_content = memory.get('memory', '') if isinstance(memory, dict) else str(memory)
-                            memory_context += f"{i}. {memory_content}\n"
-                        # Note: Memory context is from previous trusted conversations and should not be PII filtered
                 except Exception as mem_error:
-                    print(f"Error retrieving memory context: {mem_error}")
+                    logger.error("Error retrieving memory context: %s", mem_error)
+                    return ""
+                
+                # Build memory context string
+                # Note: Memory context is from previous trusted conversations and should not be PII filtered
+                if not memories:
+                    return ""
+                lines = ["\nRelevant information from previous conversations:\n"]
+                for i, memory in enumerate(memories, 1):
+                    memory_content = memory.get('memory', '') if isinstance(memory, dict) else str(memory)
+                    lines.append(f"{i}. {memory_content}\n")
+                return "".join(lines)
             
             # Retrieve knowledge base context with timeout
-            knowledge_context = ""
-            try:
-                import asyncio
-                from services.knowledge_base_service import KnowledgeBaseService
-                kb_service = KnowledgeBaseService(self.db)
-                # Add 30 second timeout for KB queries to allow for embedding generation
-                knowledge_context = await asyncio.wait_for(
-                    kb_service.query_agent_knowledge(agent.agent_id, filtered_input, top_k=5),
-                    timeout=30.0
+            async def retrieve_knowledge_context() -> str:
+                try:
+                    from services.knowledge_base_service import KnowledgeBaseService, agent_has_knowledge_bases
+                    # Most agents have no knowledge base: skip the service and the query entirely
+                    if not agent_has_knowledge_bases(self.db, agent.agent_id):
+                        return ""
+                    kb_service = KnowledgeBaseService(self.db)
+                    # Add 30 second timeout for KB queries to allow for embedding generation
+                    knowledge_context = await asyncio.wait_for(
+                        kb_service.query_agent_knowledge(agent.agent_id, filtered_input, top_k=5),
+                        timeout=30.0
+                    )
+                    # Note: Knowledge base content is trusted and should not be PII filtered
+                    if knowledge_context:
+                        logger.debug("Retrieved KB context for agent %s: %d chars", agent.agent_id, len(knowledge_context))
+                    return knowledge_context
+                except asyncio.TimeoutError:
+                    logger.warning("Knowledge base query timed out for agent %s", agent.agent_id)
+                except Exception as kb_error:
+                    logger.error("Error retrieving knowledge base context: %s", kb_error)
+                    traceback.print_exc()
+                return ""
+            
+            # Memory and knowledge base lookups are independent, so wait for both at once
+            memory_context, knowledge_context = await asyncio.gather(
+                retrieve_memory_context(),
+                retrieve_knowledge_context()
+            )
+            
+            # Deterministic agents without tools answer repeated (or near-identical) prompts from the
+            # prompt cache. Agents with tools are never cached: a stored answer would skip tool calls,
+            # which may have side effects or fetch live data.
+            prompt_cache_scope = None
+            prompt_vector = None
+            if agent.temperature == 0 and not self._agent_uses_tools(agent):
+                prompt_cache_scope = PromptCache.make_scope(
+                    agent.agent_id, agent.updated_at, active_provider, active_model, agent.temperature,
+                    agent.system_prompt, memory_context, knowledge_context
                 )
-                # Note: Knowledge base content is trusted and should not be PII filtered
-                if knowledge_context:
-                    print(f"Retrieved KB context for agent {agent.agent_id}: {len(knowledge_context)} chars")
-            except asyncio.TimeoutError:
-                print(f"Knowledge base query timed out for agent {agent.agent_id}")
-            except Exception as kb_error:
-                print(f"Error retrieving knowledge base context: {kb_error}")
-                import traceback
-                traceback.print_exc()
+                cached_response, prompt_vector = await _prompt_cache.get(prompt_cache_scope, filtered_input)
+                if cached_response is not None:
+                    logger.info(f"Prompt cache hit for agent {agent.agent_id}")
+                    return cached_response
             
             # Create the LangGraph agent based on configuration with memory context
             # Pass active provider/model to override agent's stored values during retries
@@ -1011,7 +1803,6 @@ class AgentService:
             # Execute the agent with the appropriate input format based on agent type
 
             # Add timeout to prevent hanging on slow LLM responses
-            import asyncio
             try:
                 # Use recursion_limit from agent config (already set above)
                 config = {"recursion_limit": recursion_limit}
@@ -1029,29 +1820,28 @@ class AgentService:
                         )
                     else:
                         response = await asyncio.wait_for(
-                            asyncio.to_thread(langgraph_agent.invoke, {"messages": messages}, config=config),
+                            _run_in_executor(_LLM_EXECUTOR, langgraph_agent.invoke, {"messages": messages}, config=config),
                             timeout=timeout_duration
                         )
                 else:
                     # Other agents (plan-execute, reflection, custom) expect input format
                     # For these, we'll add the knowledge base and memory context to the input
                     # KB provides static info; tools provide real-time/external capabilities
-                    enhanced_input = filtered_input
-                    if knowledge_context or memory_context:
-                        context_parts = []
-                        
-                        # Add KB context with balanced guidance
-                        if knowledge_context:
-                            kb_section = "## Knowledge Base Information\n"
-                            kb_section += knowledge_context
-                            kb_section += "\n\n**Note**: This knowledge base contains static domain information. Your tools are available for real-time data and external actions."
-                            context_parts.append(kb_section)
-                        
-                        # Add memory context second
-                        if memory_context:
-                            context_parts.append("## Previous Conversation Context\n" + memory_context)
-                        
-                        enhanced_input = f"{filtered_input}\n\n" + "\n\n".join(context_parts)
+                    # Input, KB section and memory section are joined once (KB context can be large)
+                    input_parts = [filtered_input]
+                    
+                    # Add KB context with balanced guidance
+                    if knowledge_context:
+                        input_parts.append(
+                            f"## Knowledge Base Information\n{knowledge_context}"
+                            "\n\n**Note**: This knowledge base contains static domain information. Your tools are available for real-time data and external actions."
+                        )
+                    
+                    # Add memory context second
+                    if memory_context:
+                        input_parts.append(f"## Previous Conversation Context\n{memory_context}")
+                    
+                    enhanced_input = "\n\n".join(input_parts)
                     
                     # Increase timeout to 180s for agents with knowledge bases
                     timeout_duration = 180.0 if (knowledge_context or memory_context) else 90.0
@@ -1062,59 +1852,36 @@ class AgentService:
                         )
                     else:
                         response = await asyncio.wait_for(
-                            asyncio.to_thread(langgraph_agent.invoke, {"input": enhanced_input}, config=config),
+                            _run_in_executor(_LLM_EXECUTOR, langgraph_agent.invoke, {"input": enhanced_input}, config=config),
                             timeout=timeout_duration
                         )
             except asyncio.TimeoutError:
                 raise ValueError("Agent response timed out. The LLM provider may be slow or unreachable. Please try again.")
             except Exception as e:
                 # Handle API errors more gracefully
-                error_msg = str(e)
-                
-                # Clean HTML error responses
-                if "<!DOCTYPE html>" in error_msg or "<html" in error_msg:
-                    # Extract error code if present
-                    if "500" in error_msg and "Internal server error" in error_msg:
-                        error_msg = "The AI provider (Groq) is experiencing server issues. Please try again in a few moments."
-                    elif "502" in error_msg or "Bad Gateway" in error_msg:
-                        error_msg = "The AI provider is temporarily unavailable. Please try again."
-                    elif "503" in error_msg or "Service Unavailable" in error_msg:
-                        error_msg = "The AI provider service is temporarily unavailable. Please try again."
-                    elif "504" in error_msg or "Gateway Timeout" in error_msg:
-                        error_msg = "The AI provider request timed out. Please try again."
-                    else:
-                        error_msg = "The AI provider returned an error. Please try again."
+                error_msg = _clean_html_error(
+                    str(e),
+                    server_error_message="The AI provider (Groq) is experiencing server issues. Please try again in a few moments."
+                )
                 
-                print(f"Error executing agent {agent.agent_id}: {error_msg}")
+                logger.error("Error executing agent %s: %s", agent.agent_id, error_msg)
                 
+                categories = _classify_llm_error(error_msg)
                 # Check for decommissioned model errors (Groq)
-                if "model_decommissioned" in error_msg or "has been decommissioned" in error_msg:
-                    import re
-                    model_match = re.search(r'model `([^`]+)`', error_msg)
-                    model_name = model_match.group(1) if model_match else "the selected model"
+                if "decommissioned" in categories:
                     raise ValueError(
-                        f"Model Decommissioned: {model_name} is no longer supported by Groq. "
-                        f"Please edit the agent and select a currently supported model like 'llama-3.3-70b-versatile' or 'llama-3.1-8b-instant'. "
-                        f"See https://console.groq.com/docs/models for the current model list."
+                        _DECOMMISSIONED_EXECUTION_MESSAGE.format(model_name=_decommissioned_model_name(error_msg))
                     )
-                # Check for specific API key errors from LLM providers
-                elif (("API key" in error_msg or "401" in error_msg) and 
-                    ("OpenAI" in error_msg or "Anthropic" in error_msg or "Groq" in error_msg or "api_key" in error_msg.lower())):
-                    raise ValueError("Invalid API key. Please check your API key configuration.")
-                elif "403" in error_msg and ("OpenAI" in error_msg or "Anthropic" in error_msg or "Groq" in error_msg):
-                    raise ValueError("Access forbidden. Please check your API key permissions.")
-                elif "tool_use_failed" in error_msg or "Failed to call a function" in error_msg:
-                    # Handle tool execution failures more gracefully
-                    raise ValueError("Tool execution failed. This may be due to rate limiting, network issues, or missing API keys. Please try again or check your tool configuration.")
-                elif "<!DOCTYPE html>" in str(e) or "Internal server error" in error_msg or "server issues" in error_msg:
+                for category, message in _EXECUTION_ERROR_MESSAGES.items():
+                    if category in categories:
+                        raise ValueError(message)
+                if _HTML_ERROR_RE.search(str(e)) or "Internal server error" in error_msg or "server issues" in error_msg:
                     # Provider server error - provide clean message
                     raise ValueError(error_msg)
-                else:
-                    # For other errors (including 429 rate limits), re-raise to be caught by outer handler
-                    raise e
+                # For other errors (including 429 rate limits), re-raise to be caught by outer handler
+                raise e
             
             # Extract the final response
-            # Handle different response formats
             if isinstance(response, dict):
                 logger.info(f"DEBUG: Agent response keys: {response.keys()}")
                 if "messages" in response:
@@ -1124,51 +1891,82 @@ class AgentService:
                         content_preview = str(m.content)[:200] if hasattr(m, 'content') else "No content"
                         logger.info(f"DEBUG: Msg {i} type={type(m).__name__}: {content_preview}")
 
-                if "messages" in response and len(response["messages"]) > 0:
-                    # Standard format with messages key
-                    final_message = response["messages"][-1]
-            # Return the content if available, otherwise convert to string
-            try:
-                response_text = None
-                if hasattr(final_message, 'content') and final_message.content is not None:
-                    response_text = str(final_message.content)
-                elif isinstance(final_message, dict):
-                    # If it's a dict, try to get content or convert to string
-                    response_text = str(final_message.get('content', str(final_message)))
-                else:
-                    response_text = str(final_message)
-                
-                
-                return response_text
-            except Exception as e:
-                # Fallback to string representation
-                return str(final_message)
+            response_text = self._extract_response_text(response)
+            if prompt_cache_scope is not None:
+                await _prompt_cache.set(prompt_cache_scope, filtered_input, response_text, prompt_vector)
+            return response_text
         except Exception as e:
             # Handle any unexpected errors in the execution method
-            error_msg = str(e)
+            error_msg = _clean_html_error(str(e))
             
-            # Clean HTML error responses
-            if "<!DOCTYPE html>" in error_msg or "<html" in error_msg:
-                if "500" in error_msg and "Internal server error" in error_msg:
-                    error_msg = "The AI provider is experiencing server issues. Please try again in a few moments."
-                elif "502" in error_msg or "Bad Gateway" in error_msg:
-                    error_msg = "The AI provider is temporarily unavailable. Please try again."
-                elif "503" in error_msg or "Service Unavailable" in error_msg:
-                    error_msg = "The AI provider service is temporarily unavailable. Please try again."
-                elif "504" in error_msg or "Gateway Timeout" in error_msg:
-                    error_msg = "The AI provider request timed out. Please try again."
-                else:
-                    error_msg = "The AI provider returned an error. Please try again."
-            
-            print(f"Unexpected error executing agent {agent.agent_id}: {error_msg}")
-            import traceback
+            logger.error("Unexpected error executing agent %s: %s", agent.agent_id, error_msg)
             traceback.print_exc()
             raise ValueError(f"An unexpected error occurred while processing your request: {error_msg}")
     
+    @staticmethod
+    def _extract_response_text(response: Any) -> str:
+        """Extract the final answer text from a LangGraph agent response"""
+        # Handle different response formats
+        final_message = response
+        if isinstance(response, dict):
+            if "messages" in response and len(response["messages"]) > 0:
+                # Standard format with messages key
+                final_message = response["messages"][-1]
+            elif response.get("agent_revision") or response.get("agent_result"):
+                # Reflection and custom workflows end with a single text field
+                final_message = response.get("agent_revision") or response.get("agent_result")
+            elif response.get("past_steps"):
+                # Plan & Execute returns the result of the last executed step
+                final_message = response["past_steps"][-1]
+        
+        # Return the content if available, otherwise convert to string
+        try:
+            if hasattr(final_message, 'content') and final_message.content is not None:
+                return str(final_message.content)
+            elif isinstance(final_message, dict):
+                # If it's a dict, try to get content or convert to string
+                return str(final_message.get('content', str(final_message)))
+            return str(final_message)
+        except Exception:
+            # Fallback to string representation
+            return str(final_message)
+    
+    async def arun_batch(self, agent_id: str, inputs: List[str]) -> List[str]:
+        """
+        Run many independent requests through a plan-execute, reflection or custom agent.
+        
+        All inputs share one compiled graph and are submitted together with ``abatch``,
+        so each workflow stage reaches the LLM backend concurrently and a batching
+        inference server (vLLM, TGI) can coalesce them. ReAct agents are not supported
+        because their tool loops diverge per request.
+        """
+        agent = await self.get_agent(agent_id)
+        if not agent:
+            raise ValueError("Agent not found")
+        if agent.agent_type == "react":
+            raise ValueError("Batch execution is only supported for plan-execute, reflection and custom agents")
+        if not inputs:
+            return []
+        
+        # Apply PII filtering to inputs and outputs if configured
+        pii_middleware = self._get_pii_middleware(agent)
+        if pii_middleware:
+            inputs = [pii_middleware.process_message(text, message_type="input") for text in inputs]
+        
+        recursion_limit = agent.recursion_limit if hasattr(agent, 'recursion_limit') and agent.recursion_limit else 50
+        langgraph_agent, _ = await self._create_langgraph_agent(agent)
+        responses = await langgraph_agent.abatch(
+            [{"input": text} for text in inputs],
+            config={"recursion_limit": recursion_limit, "max_concurrency": settings.AGENT_BATCH_MAX_CONCURRENCY}
+        )
+        
+        results = [self._extract_response_text(response) for response in responses]
+        if pii_middleware:
+            results = [pii_middleware.process_message(text, message_type="output") for text in results]
+        return results
+    
     async def stream_agent(self, websocket, agent_id: str, message: Optional[str] = None, session_id: Optional[str] = None):
         """Stream agent responses via WebSocket with real-time progress updates"""
-        import uuid
-        import json
         
         agent = await self.get_agent(agent_id)
         if not agent:
@@ -1177,10 +1975,11 @@ class AgentService:
                 "error": "Agent not found",
                 "timestamp": datetime.utcnow().isoformat()
             }
-            await websocket.send_json(error_event)
+            await websocket.send_text(json_dumps(error_event))
             await websocket.close()
             return
         
+        # session_id doubles as the memory user_id and checkpointer thread_id; it must not be guessable
         run_id = str(uuid.uuid4())
         session_id = session_id or f"session_{run_id}"
         
@@ -1200,7 +1999,6 @@ class AgentService:
             
         except Exception as e:
             logger.error(f"Error in stream_agent: {e}")
-            import traceback
             traceback.print_exc()
             error_event = {
                 "type": "error",
@@ -1209,7 +2007,7 @@ class AgentService:
                 "session_id": session_id,
                 "timestamp": datetime.utcnow().isoformat()
             }
-            await websocket.send_json(error_event)
+            await websocket.send_text(json_dumps(error_event))
         finally:
             # Close connection when done
             try:
@@ -1226,7 +2024,6 @@ class AgentService:
         run_id: str
     ) -> str:
         """Execute agent with LangGraph astream_events for real-time progress streaming"""
-        from datetime import datetime
         
         agent = await self.get_agent(agent_id)
         if not agent:
@@ -1234,10 +2031,9 @@ class AgentService:
         
         # Apply PII filtering if configured
         filtered_input = input_text
-        if agent.pii_config:
-            pii_middleware = create_pii_middleware_from_config(agent.pii_config)
-            if pii_middleware:
-                filtered_input = pii_middleware.process_message(input_text, message_type="input")
+        pii_middleware = self._get_pii_middleware(agent)
+        if pii_middleware:
+            filtered_input = pii_middleware.process_message(input_text, message_type="input")
         
         # Create agent graph with memory context
         memory_context = ""
@@ -1252,7 +2048,7 @@ class AgentService:
                     llm_model="llama-3.1-8b-instant"
                 )
                 if memories:
-                    memory_context = "\\n".join([m.get("memory", "") for m in memories])
+                    memory_context = "\n".join([m.get("memory", "") for m in memories])
             except Exception as e:
                 logger.warning(f"Error retrieving memory: {e}")
         
@@ -1261,11 +2057,33 @@ class AgentService:
         # Track streaming state
         accumulated_response = ""
         active_tools = {}  # Track active tool calls {tool_call_id: {name, start_time}}
+        streamed_message_ids = set()  # AI messages whose tokens were already sent as generated
+        final_output = None
+        
+        # ReAct agents take messages; workflow agents take the raw input and only stream their answer node
+        is_react = agent.agent_type == "react"
+        answer_node = _STREAMED_ANSWER_NODES.get(agent.agent_type, _DEFAULT_STREAMED_ANSWER_NODE)
+        
+        async def send_chunked(content: str):
+            """Send a complete (non-streamed) response in small chunks for smoother rendering"""
+            nonlocal accumulated_response
+            chunk_size = 10
+            for i in range(0, len(content), chunk_size):
+                token = content[i:i+chunk_size]
+                accumulated_response += token
+                await websocket.send_text(json_dumps({
+                    "type": "llm_token",
+                    "content": token,
+                    "run_id": run_id,
+                    "session_id": session_id
+                }))
         
         try:
-            # Use astream instead of astream_events for better compatibility
             config = {"configurable": {"thread_id": session_id}}
-            input_messages = {"messages": [HumanMessage(content=filtered_input)]}
+            if is_react:
+                input_messages = {"messages": [HumanMessage(content=filtered_input)]}
+            else:
+                input_messages = {"input": filtered_input}
             
             logger.info(f"🚀 Starting agent execution with streaming for agent {agent_id}")
             
@@ -1276,11 +2094,40 @@ class AgentService:
                 "session_id": session_id,
                 "timestamp": datetime.utcnow().isoformat()
             }
-            await websocket.send_json(thinking_event)
+            await websocket.send_text(json_dumps(thinking_event))
             
-            # Stream the agent execution
-            async for chunk in agent_graph.astream(input_messages, config=config, stream_mode="updates"):
-                logger.info(f"� Received chunk: {chunk}")
+            # Stream the agent execution: LLM tokens as they are generated, node outputs for tool events
+            async for event in agent_graph.astream_events(input_messages, config=config, version="v2"):
+                event_type = event["event"]
+                node_name = event.get("metadata", {}).get("langgraph_node")
+                
+                # Forward the answer node's LLM tokens as they arrive
+                if event_type == "on_chat_model_stream":
+                    if answer_node is None or node_name != answer_node:
+                        continue
+                    message_chunk = event["data"]["chunk"]
+                    token = _message_chunk_text(message_chunk.content)
+                    if token:
+                        streamed_message_ids.add(message_chunk.id)
+                        accumulated_response += token
+                        await websocket.send_text(json_dumps({
+                            "type": "llm_token",
+                            "content": token,
+                            "run_id": run_id,
+                            "session_id": session_id
+                        }))
+                    continue
+                
+                # Final state of the whole graph (the root run has no parents)
+                if event_type == "on_chain_end" and not event.get("parent_ids"):
+                    final_output = event["data"].get("output")
+                    continue
+                
+                # Completed node outputs (the same shape as stream_mode="updates"; the graph input is skipped)
+                if event_type != "on_chain_end" or event.get("name") != node_name or node_name == "__start__":
+                    continue
+                chunk = {node_name: event["data"].get("output")}
+                logger.debug(f"Node {node_name} completed")
                 
                 # Extract messages from the chunk
                 if isinstance(chunk, dict):
@@ -1289,8 +2136,8 @@ class AgentService:
                             messages = node_output["messages"]
                             if isinstance(messages, list):
                                 for msg in messages:
-                                    # Handle AI message with content
-                                    if hasattr(msg, "content") and msg.content:
+                                    # Handle AI message with content (unless its tokens were already streamed)
+                                    if hasattr(msg, "content") and msg.content and getattr(msg, "id", None) not in streamed_message_ids:
                                         # SKIP tool messages to prevent double rendering (tool results are shown in UI)
                                         if hasattr(msg, "type") and msg.type == "tool":
                                             logger.debug(f"Skipping tool message content from streaming")
@@ -1308,28 +2155,16 @@ class AgentService:
                                             # If there's actual content alongside tool_calls, stream it (it's the final response)
                                             logger.debug(f"Streaming AI message with tool_calls but has content: {len(content_text)} chars")
                                         
-                                        # Stream content token by token
-                                        content = str(msg.content)
-                                        # Send in chunks for smoother streaming
-                                        chunk_size = 10
-                                        for i in range(0, len(content), chunk_size):
-                                            token = content[i:i+chunk_size]
-                                            accumulated_response += token
-                                            
-                                            token_event = {
-                                                "type": "llm_token",
-                                                "content": token,
-                                                "run_id": run_id,
-                                                "session_id": session_id
-                                            }
-                                            await websocket.send_json(token_event)
+                                        # The model did not stream (e.g. cached or non-streaming provider):
+                                        # send the content in chunks for smoother rendering
+                                        await send_chunked(str(msg.content))
                                     
                                     # Handle tool calls
                                     if hasattr(msg, "tool_calls") and msg.tool_calls:
                                         # Process only the first tool call to match sequential execution logic
                                         # Additional tool calls will be reconsidered by the agent after each result
                                         first_tool_call = msg.tool_calls[0]
-                                        tool_call_id = first_tool_call.get("id", str(uuid.uuid4()))
+                                        tool_call_id = first_tool_call.get("id", _fast_id())
                                         tool_name = first_tool_call.get("name", "unknown")
                                         tool_args = first_tool_call.get("args", {})
 
@@ -1348,7 +2183,7 @@ class AgentService:
                                             "session_id": session_id,
                                             "timestamp": datetime.utcnow().isoformat()
                                         }
-                                        await websocket.send_json(tool_start_event)
+                                        await websocket.send_text(json_dumps(tool_start_event))
                                         logger.info(f"🔧 Tool call started: {tool_name} (sequential mode)")
                                     
                                     # Handle tool messages (results)
@@ -1368,10 +2203,15 @@ class AgentService:
                                                 "session_id": session_id,
                                                 "timestamp": datetime.utcnow().isoformat()
                                             }
-                                            await websocket.send_json(tool_end_event)
+                                            await websocket.send_text(json_dumps(tool_end_event))
                                             logger.info(f"✅ Tool call completed: {tool_info['name']}")
                                             del active_tools[tool_call_id]
             
+            # Workflow answers that were not streamed token by token (JSON nodes, cached or
+            # non-streaming LLMs) are sent from the final graph state
+            if not is_react and not accumulated_response and final_output:
+                await send_chunked(self._extract_response_text(final_output))
+            
             # Send completion event
             complete_event = {
                 "type": "agent_complete",
@@ -1379,15 +2219,14 @@ class AgentService:
                 "session_id": session_id,
                 "timestamp": datetime.utcnow().isoformat()
             }
-            await websocket.send_json(complete_event)
+            await websocket.send_text(json_dumps(complete_event))
             logger.info("✅ Agent execution complete")
             
             # Apply PII filtering to output if configured
             final_response = accumulated_response
-            if agent.pii_config:
-                pii_middleware = create_pii_middleware_from_config(agent.pii_config)
-                if pii_middleware:
-                    final_response = pii_middleware.process_message(accumulated_response, message_type="output")
+            pii_middleware = self._get_pii_middleware(agent)
+            if pii_middleware:
+                final_response = pii_middleware.process_message(accumulated_response, message_type="output")
             
             # Store in memory if enabled
             if self.memory_service.is_enabled():
@@ -1396,8 +2235,9 @@ class AgentService:
                         {"role": "user", "content": input_text},
                         {"role": "assistant", "content": final_response}
                     ]
-                    self.memory_service.add_memory(
-                        interaction,
+                    _memory_writes.enqueue(
+                        self.memory_service,
+                        messages=interaction,
                         user_id=session_id,
                         agent_id=agent_id,
                         llm_provider="groq",
@@ -1417,7 +2257,7 @@ class AgentService:
                 "session_id": session_id,
                 "timestamp": datetime.utcnow().isoformat()
             }
-            await websocket.send_json(error_event)
+            await websocket.send_text(json_dumps(error_event))
             raise
     
     async def _create_langgraph_agent(
@@ -1433,12 +2273,7 @@ class AgentService:
         logger.info(f"Creating agent {agent_config.agent_id} with type={agent_config.agent_type}")
         
         # Decrypt the user API key if available
-        user_api_key = None
-        if hasattr(agent_config, 'api_key_encrypted') and agent_config.api_key_encrypted:
-            try:
-                user_api_key = self._decrypt_api_key(agent_config.api_key_encrypted)
-            except Exception as e:
-                print(f"Warning: Could not decrypt API key for agent {agent_config.agent_id}: {e}")
+        user_api_key = self._agent_api_key(agent_config)
         
         # Use override values if provided (for rate limit fallback), otherwise use agent's configured values
         active_provider = override_provider or agent_config.llm_provider
@@ -1448,6 +2283,19 @@ class AgentService:
         if active_provider.lower() == "groq" and not user_api_key:
             raise ValueError("No API key configured for Groq. Please add an API key to this agent.")
         
+        # Graphs read per-request memory and knowledge context from context variables, so one
+        # compiled graph serves every request for the same agent version
+        _request_memory_context.set(memory_context)
+        _request_knowledge_context.set(knowledge_context)
+        logger.debug(f"Request memory context {_memory_context_hash(memory_context)} for agent {agent_config.agent_id}")
+        graph_cache = _WORKFLOW_GRAPH_CACHE
+        if agent_config.agent_type == "react":
+            graph_cache = None if self._agent_uses_tools(agent_config) else _REACT_GRAPH_CACHE
+        graph_key = _agent_graph_key(agent_config, active_provider, active_model, user_api_key)
+        cached_graph = graph_cache.get(graph_key) if graph_cache is not None else None
+        if cached_graph is not None:
+            return cached_graph, []
+        
         # Initialize the LLM based on provider and user API key
         llm = self._initialize_llm(
             active_provider,
@@ -1460,14 +2308,17 @@ class AgentService:
         # NOTE: MCP tools are ONLY loaded for agent_type="react"
         if agent_config.agent_type == "react":
             logger.info(f"Agent {agent_config.agent_id} is type='react' - will load MCP tools")
-            graph = await self._create_react_agent(llm, agent_config, memory_context, knowledge_context)
-            return graph, []
+            graph = await self._create_react_agent(llm, agent_config)
         elif agent_config.agent_type == "plan-execute":
-            return self._create_plan_execute_agent(llm, agent_config, memory_context), []
+            graph = self._create_plan_execute_agent(llm, agent_config)
         elif agent_config.agent_type == "reflection":
-            return self._create_reflection_agent(llm, agent_config, memory_context), []
+            graph = self._create_reflection_agent(llm, agent_config)
         else:  # custom
-            return self._create_custom_agent(llm, agent_config, memory_context), []
+            graph = self._create_custom_agent(llm, agent_config)
+        
+        if graph_cache is not None:
+            graph_cache[graph_key] = graph
+        return graph, []
     
     def _initialize_llm(self, provider: str, model: str, temperature: float, user_api_key: Optional[str] = None):
         """Initialize the LLM based on provider and user API key"""
@@ -1476,10 +2327,23 @@ class AgentService:
             raise ValueError(f"No model specified for {provider} provider. Please select a valid model.")
         
         # Use LLMService which supports LiteLLM
-        use_litellm = os.getenv("USE_LITELLM", "true").lower() == "true"
+        use_litellm = settings.USE_LITELLM
+        
+        cache_key = (
+            provider,
+            model,
+            round(temperature, 3) if temperature is not None else None,
+            hashlib.sha256(user_api_key.encode()).hexdigest() if user_api_key else None,
+            use_litellm,
+            # Clients hold the running loop's HTTP client, so each event loop gets its own instances
+            http_client_kwargs().get("http_async_client")
+        )
+        llm = _LLM_CACHE.get(cache_key)
+        if llm is not None:
+            return llm
         
         try:
-            return self.llm_service.initialize_llm(
+            llm = self.llm_service.initialize_llm(
                 provider=provider,
                 model=model,
                 temperature=temperature,
@@ -1490,7 +2354,15 @@ class AgentService:
         except Exception as e:
             logger.warning(f"Error initializing LLM with LLMService: {e}, falling back to direct")
             # Fallback to direct initialization
-            return self._initialize_llm_direct(provider, model, temperature, user_api_key)
+            llm = self._initialize_llm_direct(provider, model, temperature, user_api_key)
+        
+        # Sampled outputs are meant to vary between calls, so only deterministic
+        # (temperature 0) clients get the response cache
+        if not temperature and _LLM_RESPONSE_CACHE is not None and hasattr(llm, "cache"):
+            llm.cache = _LLM_RESPONSE_CACHE
+        
+        _LLM_CACHE[cache_key] = llm
+        return llm
     
     def _initialize_llm_direct(self, provider: str, model: str, temperature: float, user_api_key: Optional[str] = None):
         """Direct LLM initialization (fallback)"""
@@ -1504,16 +2376,17 @@ class AgentService:
         groq_api_key = user_api_key or settings.GROQ_API_KEY
         
         # Check if API keys are available
-        openai_key_available = bool(openai_api_key and openai_api_key.strip())
-        anthropic_key_available = bool(anthropic_api_key and anthropic_api_key.strip())
-        groq_key_available = bool(groq_api_key and groq_api_key.strip())
+        openai_key_available = _api_key_available(openai_api_key)
+        anthropic_key_available = _api_key_available(anthropic_api_key)
+        groq_key_available = _api_key_available(groq_api_key)
         
         if provider == "openai" and openai_key_available:
             return ChatOpenAI(
                 model=model,
                 temperature=temperature,
                 api_key=openai_api_key,
-                max_tokens=2000  # Increased from 300 to allow tool reasoning and responses
+                max_tokens=2000,  # Increased from 300 to allow tool reasoning and responses
+                **http_client_kwargs()
             )
         elif provider == "anthropic" and anthropic_key_available:
             return ChatAnthropic(
@@ -1530,6 +2403,7 @@ class AgentService:
                 temperature=temperature,
                 api_key=user_api_key,
                 base_url="https://openrouter.ai/api/v1",
+                **http_client_kwargs(),
                 max_tokens=2000,  # Increased from 300 to allow tool reasoning and responses
                 default_headers={
                     "HTTP-Referer": "https://execution-plane.local",
@@ -1554,7 +2428,8 @@ class AgentService:
                 model=model,
                 temperature=temperature,
                 groq_api_key=groq_api_key,
-                max_tokens=2000  # Increased from 300 to allow tool reasoning and responses
+                max_tokens=2000,  # Increased from 300 to allow tool reasoning and responses
+                **http_client_kwargs()
             )
         # Add other providers as needed
         elif openai_key_available:
@@ -1563,7 +2438,8 @@ class AgentService:
                 model=model,
                 temperature=temperature,
                 api_key=openai_api_key,
-                max_tokens=2000  # Increased from 300 to allow tool reasoning and responses
+                max_tokens=2000,  # Increased from 300 to allow tool reasoning and responses
+                **http_client_kwargs()
             )
         else:
             # Return a mock LLM that provides informative responses when no API key is available
@@ -1576,12 +2452,6 @@ class AgentService:
     
     def _create_custom_react_agent(self, llm, tools, system_prompt: str):
         """Create a custom ReAct agent using LangGraph for better control"""
-        from langgraph.graph import StateGraph, START, END
-        from langgraph.prebuilt import ToolNode
-        from typing import Annotated, Sequence, TypedDict, Union
-        from langchain_core.messages import BaseMessage, SystemMessage
-        from langgraph.graph.message import add_messages
-
         class AgentState(TypedDict):
             messages: Annotated[Sequence[BaseMessage], add_messages]
 
@@ -1611,7 +2481,6 @@ class AgentService:
         
         def tools_node(state: AgentState):
             """Execute tools SEQUENTIALLY (one at a time) for more robust reasoning"""
-            from langchain_core.messages import ToolMessage
             messages = state["messages"]
             last_message = messages[-1]
             
@@ -1675,12 +2544,12 @@ class AgentService:
 
         return workflow.compile()
 
-    async def _create_react_agent(self, llm, agent_config, memory_context: str = "", knowledge_context: str = ""):
+    async def _create_react_agent(self, llm, agent_config):
         """Create a custom agent using AgentBuilder (Function Calling Engine)."""
         
         # Initialize builder with recursion limit from agent config (single source of truth)
         recursion_limit = agent_config.recursion_limit if hasattr(agent_config, 'recursion_limit') and agent_config.recursion_limit else 50
-        builder = AgentBuilder(llm, recursion_limit=recursion_limit)
+        builder = AgentBuilder(llm, recursion_limit=recursion_limit, cache_system_prompt=_supports_cache_control(llm))
         logger.info(f"🔄 Agent recursion limit set to: {recursion_limit}")
         
         # Load MCP tools (raw dicts)
@@ -1705,30 +2574,15 @@ class AgentService:
             except Exception as e:
                 logger.error(f"Error loading external tools: {e}")
 
-        # Construct system prompt
-        system_content = agent_config.system_prompt or "You are a helpful AI assistant."
+        # Construct system prompt per call from the current request's knowledge and memory context
+        base_prompt = agent_config.system_prompt or "You are a helpful AI assistant."
+        has_tools = bool(builder.tools)
         
-        if knowledge_context:
-            system_content += f"\n\n## Knowledge Base Information\n{knowledge_context}"
-            system_content += "\n\n**Note**: This knowledge base contains verified information. Use it for reference."
-            
-        if memory_context:
-            system_content += f"\n\n## Context from Previous Conversations\n{memory_context}"
-            
-        # Add tool guidance
-        if builder.tools:
-            system_content += "\n\n## 🛠️ AVAILABLE TOOLS\nUse these tools to perform actions. When a tool is applicable, use it immediately."
-            
-        return builder.build(system_prompt=system_content)
+        return builder.build(system_prompt=_react_system_prompt(base_prompt, has_tools))
     
-    def _create_plan_execute_agent(self, llm, agent_config, memory_context: str = ""):
+    def _create_plan_execute_agent(self, llm, agent_config):
         """Create a generic Plan & Execute agent for complex multi-step tasks"""
-        from langchain_core.prompts import PromptTemplate
-        from langchain_core.output_parsers import StrOutputParser
-        
         # Define state for the agent
-        from typing import Annotated, Sequence, TypedDict
-        from langgraph.graph import add_messages
         
         class PlanExecuteState(TypedDict):
             input: str
@@ -1736,72 +2590,52 @@ class AgentService:
             past_steps: Annotated[Sequence[str], add_messages]
             response: str
         
-        # Planner node - creates a plan
-        def planner_node(state: PlanExecuteState):
-            """Create a plan for executing the user request"""
-            system_prompt = agent_config.system_prompt or "You are an expert at creating plans for complex tasks."
-            if memory_context:
-                system_prompt += f"\n\n{memory_context}"
-                
-            planner_prompt = PromptTemplate.from_template(f"""{system_prompt}
-            
-For the user request, create a SHORT plan of up to 5 steps. Each step must be a single actionable line. Be concise.
-
-User Request: {{input}}
-
-Plan:""")
-            
-            chain = planner_prompt | llm | StrOutputParser()
-            plan = chain.invoke({"input": state["input"]})
-            return {"agent_plan": plan}
-        
-        # Executor node - executes the plan
-        def executor_node(state: PlanExecuteState):
-            """Execute the plan steps"""
-            system_prompt = agent_config.system_prompt or "You are an expert at executing plans."
-            if memory_context:
-                system_prompt += f"\n\n{memory_context}"
-                
-            executor_prompt = PromptTemplate.from_template(f"""{system_prompt}
-            
-Here is the plan to execute (concise execution, <=100 words):
-{{agent_plan}}
-
-Execute the next step and return a brief result.
-
-Previous steps: {{past_steps}}
-
-Next step result:""")
-            
-            chain = executor_prompt | llm | StrOutputParser()
-            result = chain.invoke({
-                "agent_plan": state["agent_plan"],
-                "past_steps": "\n".join(state["past_steps"]) if state["past_steps"] else "None"
-            })
-            
-            return {"past_steps": [result]}
+        logger.debug(f"Building plan-execute graph for agent {agent_config.agent_id}")
+        
+        # Deterministic agents reuse node responses for equivalent inputs
+        cache_scope = _node_cache_scope(llm, agent_config)
+        
+        # The plan and its first step come from a single LLM call; the system prompt leads so it can be prefix-cached
+        plan_execute_prompts = _NodePrompts(
+            llm, agent_config.system_prompt or "You are an expert at planning and executing complex tasks.", _PLAN_EXECUTE_PROMPT
+        )
+        try:
+            plan_execute_llm = _limit_tokens(llm, _NODE_MAX_TOKENS["plan_execute"]).with_structured_output(PlanExecuteOutput)
+            plan_execute_fingerprint = _node_fingerprint(_PLAN_EXECUTE_PROMPT, _NODE_MAX_TOKENS["plan_execute"], PlanExecuteOutput)
+        except NotImplementedError:
+            # LLMs without tool/JSON-mode support follow the JSON instructions in the prompt
+            plan_execute_llm = _limit_tokens(llm, _NODE_MAX_TOKENS["plan_execute"])
+            plan_execute_fingerprint = _node_fingerprint(_PLAN_EXECUTE_PROMPT, _NODE_MAX_TOKENS["plan_execute"])
+        
+        # Plan-execute node - plans the request and executes the first step
+        async def plan_execute_node(state: PlanExecuteState):
+            """Create a plan and execute its first step in one pass"""
+            plan_execute_system, plan_execute_prompt = plan_execute_prompts.current()
+            output = await _cached_node_call(
+                cache_scope, "plan_execute", plan_execute_fingerprint, plan_execute_system, plan_execute_llm, plan_execute_prompt, {"input": state["input"]}
+            )
+            output = _parse_plan_execute_output(output)
+            plan = "\n".join(
+                f"{i}. {_PLAN_STEP_PREFIX.sub('', step).strip()}"
+                for i, step in enumerate(output.plan[:_MAX_PLAN_STEPS], 1)
+            )
+            return {"agent_plan": plan, "past_steps": [output.result]}
         
         # Create the workflow
         workflow = StateGraph(PlanExecuteState)
         
         # Add nodes
-        workflow.add_node("planner", planner_node)
-        workflow.add_node("executor", executor_node)
+        workflow.add_node("plan_execute", plan_execute_node)
         
         # Add edges
-        workflow.set_entry_point("planner")
-        workflow.add_edge("planner", "executor")
-        workflow.add_edge("executor", END)
+        workflow.set_entry_point("plan_execute")
+        workflow.add_edge("plan_execute", END)
         
         # Compile without checkpointer
         return workflow.compile()
     
-    def _create_reflection_agent(self, llm, agent_config, memory_context: str = ""):
+    def _create_reflection_agent(self, llm, agent_config):
         """Create a generic Reflection agent that improves its responses through self-evaluation"""
-        from langchain_core.prompts import PromptTemplate
-        from langchain_core.output_parsers import StrOutputParser
-        from typing import Annotated, Sequence, TypedDict
-        from langgraph.graph import add_messages
         
         class ReflectionState(TypedDict):
             input: str
@@ -1809,96 +2643,48 @@ Next step result:""")
             agent_critique: str
             agent_revision: str
         
-        # Agent node - generates initial response
-        def agent_node(state: ReflectionState):
-            """Generate initial response"""
-            system_prompt = agent_config.system_prompt or "You are a helpful AI assistant."
-            if memory_context:
-                system_prompt += f"\n\n{memory_context}"
-                
-            agent_prompt = PromptTemplate.from_template(f"""{system_prompt}
-            
-Provide a concise response to the user request (<=120 words, up to 5 bullets if needed).
-
-User Request: {{input}}
-
-Response:""")
-            
-            chain = agent_prompt | llm | StrOutputParser()
-            draft = chain.invoke({"input": state["input"]})
-            return {"agent_draft": draft}
-        
-        # Critique node - evaluates the response
-        def critique_node(state: ReflectionState):
-            """Critique the initial response"""
-            system_prompt = agent_config.system_prompt or "You are an expert reviewer."
-            if memory_context:
-                system_prompt += f"\n\n{memory_context}"
-                
-            critique_prompt = PromptTemplate.from_template(f"""{system_prompt}
-            
-Review the following response for quality, accuracy, and unnecessary verbosity. Suggest how to make it shorter while preserving key information.
-
-Response: {{agent_draft}}
-
-User Request: {{input}}
-
-Critique:""")
-            
-            chain = critique_prompt | llm | StrOutputParser()
-            critique = chain.invoke({"agent_draft": state["agent_draft"], "input": state["input"]})
-            return {"agent_critique": critique}
-        
-        # Revision node - improves based on critique
-        def revision_node(state: ReflectionState):
-            """Revise the response based on critique"""
-            system_prompt = agent_config.system_prompt or "You are an expert editor."
-            if memory_context:
-                system_prompt += f"\n\n{memory_context}"
-                
-            revision_prompt = PromptTemplate.from_template(f"""{system_prompt}
-            
-Improve the response based on the critique. Make it concise (<=120 words) and to the point.
-
-Original Response: {{agent_draft}}
-
-Critique: {{agent_critique}}
-
-User Request: {{input}}
-
-Improved Response:""")
-            
-            chain = revision_prompt | llm | StrOutputParser()
-            revision = chain.invoke({
-                "agent_draft": state["agent_draft"], 
-                "agent_critique": state["agent_critique"],
-                "input": state["input"]
-            })
-            return {"agent_revision": revision}
+        logger.debug(f"Building reflection graph for agent {agent_config.agent_id}")
+        
+        # Deterministic agents reuse node responses for equivalent inputs
+        cache_scope = _node_cache_scope(llm, agent_config)
+        
+        # Draft, critique and revision are produced in a single LLM call; the system prompt leads so it can be prefix-cached
+        reflect_prompts = _NodePrompts(llm, agent_config.system_prompt or "You are a helpful AI assistant.", _REFLECTION_PROMPT)
+        try:
+            reflect_llm = _limit_tokens(llm, _NODE_MAX_TOKENS["reflect"]).with_structured_output(ReflectionOutput)
+            reflect_fingerprint = _node_fingerprint(_REFLECTION_PROMPT, _NODE_MAX_TOKENS["reflect"], ReflectionOutput)
+        except NotImplementedError:
+            # LLMs without tool/JSON-mode support follow the JSON instructions in the prompt
+            reflect_llm = _limit_tokens(llm, _NODE_MAX_TOKENS["reflect"])
+            reflect_fingerprint = _node_fingerprint(_REFLECTION_PROMPT, _NODE_MAX_TOKENS["reflect"])
+        
+        # Reflect node - drafts, critiques and revises the response
+        async def reflect_node(state: ReflectionState):
+            """Draft, critique and revise the response in one pass"""
+            reflect_system, reflect_prompt = reflect_prompts.current()
+            output = await _cached_node_call(cache_scope, "reflect", reflect_fingerprint, reflect_system, reflect_llm, reflect_prompt, {"input": state["input"]})
+            output = _parse_reflection_output(output)
+            return {
+                "agent_draft": output.draft,
+                "agent_critique": output.critique,
+                "agent_revision": output.revision or output.draft
+            }
         
         # Create the workflow
         workflow = StateGraph(ReflectionState)
         
         # Add nodes
-        workflow.add_node("agent", agent_node)
-        workflow.add_node("critique", critique_node)
-        workflow.add_node("revision", revision_node)
+        workflow.add_node("reflect", reflect_node)
         
         # Add edges
-        workflow.set_entry_point("agent")
-        workflow.add_edge("agent", "critique")
-        workflow.add_edge("critique", "revision")
-        workflow.add_edge("revision", END)
+        workflow.set_entry_point("reflect")
+        workflow.add_edge("reflect", END)
         
         # Compile without checkpointer
         return workflow.compile()
     
-    def _create_custom_agent(self, llm, agent_config, memory_context: str = ""):
+    def _create_custom_agent(self, llm, agent_config):
         """Create a flexible custom agent graph for specialized workflows"""
-        from langchain_core.prompts import PromptTemplate
-        from langchain_core.output_parsers import StrOutputParser
-        from typing import Annotated, Sequence, TypedDict
-        from langgraph.graph import add_messages
         
         class CustomAgentState(TypedDict):
             input: str
@@ -1906,65 +2692,44 @@ Improved Response:""")
             agent_action: str
             agent_result: str
         
+        logger.debug(f"Building custom graph for agent {agent_config.agent_id}")
+        
+        # Deterministic agents reuse node responses for equivalent inputs
+        cache_scope = _node_cache_scope(llm, agent_config)
+        
+        # Build prompts once per agent; the system prompt leads so it can be prefix-cached
+        # (all three nodes share the same system prompt)
+        base_prompt = agent_config.system_prompt or "You are a helpful assistant."
+        analysis_prompts = _NodePrompts(llm, base_prompt, _ANALYSIS_PROMPT)
+        action_prompts = _NodePrompts(llm, base_prompt, _ACTION_PROMPT)
+        result_prompts = _NodePrompts(llm, base_prompt, _RESULT_PROMPT)
+        analysis_llm = _limit_tokens(llm, _NODE_MAX_TOKENS["analysis"])
+        action_llm = _limit_tokens(llm, _NODE_MAX_TOKENS["action"])
+        result_llm = _limit_tokens(llm, _NODE_MAX_TOKENS["result"])
+        analysis_fingerprint = _node_fingerprint(_ANALYSIS_PROMPT, _NODE_MAX_TOKENS["analysis"])
+        action_fingerprint = _node_fingerprint(_ACTION_PROMPT, _NODE_MAX_TOKENS["action"])
+        result_fingerprint = _node_fingerprint(_RESULT_PROMPT, _NODE_MAX_TOKENS["result"])
+        
         # Analysis node - analyzes the request
-        def analysis_node(state: CustomAgentState):
+        async def analysis_node(state: CustomAgentState):
             """Analyze the user request and determine the approach"""
-            system_prompt = agent_config.system_prompt or "You are a helpful assistant."
-            if memory_context:
-                system_prompt += f"\n\n{memory_context}"
-                
-            analysis_prompt = PromptTemplate.from_template(f"""{system_prompt}
-            
-You are an expert problem analyzer. Provide a brief analysis (3-5 bullet points max).
-
-User Request: {{input}}
-
-Analysis:""")
-            
-            chain = analysis_prompt | llm | StrOutputParser()
-            analysis = chain.invoke({"input": state["input"]})
+            system_prompt, analysis_prompt = analysis_prompts.current()
+            analysis = await _cached_node_call(cache_scope, "analysis", analysis_fingerprint, system_prompt, analysis_llm, analysis_prompt, {"input": state["input"]})
             return {"agent_analysis": analysis}
         
-        # Action node - takes action based on analysis
-        def action_node(state: CustomAgentState):
-            """Take action based on analysis"""
-            system_prompt = agent_config.system_prompt or "You are a helpful assistant."
-            if memory_context:
-                system_prompt += f"\n\n{memory_context}"
-                
-            action_prompt = PromptTemplate.from_template(f"""{system_prompt}
-            
-You are an expert problem solver. Based on the analysis, determine the best action. Keep it brief (<=80 words).
-
-Analysis: {{agent_analysis}}
-
-User Request: {{input}}
-
-Action:""")
-            
-            chain = action_prompt | llm | StrOutputParser()
-            action = chain.invoke({"agent_analysis": state["agent_analysis"], "input": state["input"]})
+        # Action node - determines the action, independently of the analysis so both run concurrently
+        async def action_node(state: CustomAgentState):
+            """Determine the action to take for the request"""
+            system_prompt, action_prompt = action_prompts.current()
+            action = await _cached_node_call(cache_scope, "action", action_fingerprint, system_prompt, action_llm, action_prompt, {"input": state["input"]})
             return {"agent_action": action}
         
-        # Result formatter node - formats the result
-        def result_node(state: CustomAgentState):
+        # Result formatter node - reconciles analysis and action into the final result
+        async def result_node(state: CustomAgentState):
             """Format the final result"""
-            system_prompt = agent_config.system_prompt or "You are a helpful assistant."
-            if memory_context:
-                system_prompt += f"\n\n{memory_context}"
-                
-            result_prompt = PromptTemplate.from_template(f"""{system_prompt}
-            
-Provide a clear, concise response to the user's request based on the action taken (<=120 words, up to 5 bullets).
-
-Action Taken: {{agent_action}}
-
-User Request: {{input}}
-
-Final Response:""")
-            
-            chain = result_prompt | llm | StrOutputParser()
-            result = chain.invoke({
+            system_prompt, result_prompt = result_prompts.current()
+            result = await _cached_node_call(cache_scope, "result", result_fingerprint, system_prompt, result_llm, result_prompt, {
+                "agent_analysis": state["agent_analysis"],
                 "agent_action": state["agent_action"], 
                 "input": state["input"]
             })
@@ -1978,11 +2743,11 @@ Final Response:""")
         workflow.add_node("action", action_node)
         workflow.add_node("result", result_node)
         
-        # Add edges
-        workflow.set_entry_point("analysis")
-        workflow.add_edge("analysis", "action")
-        workflow.add_edge("action", "result")
+        # Add edges - analysis and action fan out in parallel and join at result
+        workflow.add_edge(START, "analysis")
+        workflow.add_edge(START, "action")
+        workflow.add_edge(["analysis", "action"], "result")
         workflow.add_edge("result", END)
         
         # Compile without checkpointer
-        return workflow.compile()
\ No newline at end of file
+        return workflow.compile()
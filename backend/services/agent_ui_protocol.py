@@ -4,6 +4,7 @@ Supports real-time streaming, status updates, tool calls, and structured message
 """
 import json
 import logging
+from utils.json_utils import dumps as json_dumps
 from typing import Dict, Any, Optional, AsyncIterator
 from enum import Enum
 from datetime import datetime
@@ -103,7 +104,7 @@ class ProtocolMessage:
     
     def to_json(self) -> str:
         """Convert message to JSON string"""
-        return json.dumps(self.to_dict())
+        return json_dumps(self.to_dict())
 
 
 class ProtocolMessageEncoder(JSONEncoder):
@@ -5,6 +5,7 @@ Handles secure storage, encryption, and management of API keys and credentials
 import uuid
 import json
 import base64
+import functools
 import logging
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
@@ -21,13 +22,31 @@ from core.config import settings
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=4)
+def _derive_key(password: bytes, salt: bytes) -> bytes:
+    """PBKDF2-derive a Fernet key; memoized because the 100k iterations dominate service construction."""
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=100000,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(password))
+
+
+@functools.lru_cache(maxsize=4)
+def get_fernet(key: bytes) -> Fernet:
+    """Fernet cipher for an encryption key, built once per process (shared with AgentService)."""
+    return Fernet(key)
+
+
 class CredentialsService:
     """Service for managing encrypted credentials"""
     
     def __init__(self, db: Session):
         self.db = db
         self.encryption_key = self._get_encryption_key()
-        self.fernet = Fernet(self.encryption_key)
+        self.fernet = get_fernet(self.encryption_key)
         
     def _get_encryption_key(self) -> bytes:
         """
@@ -41,15 +60,7 @@ class CredentialsService:
             # Generate a key from a password (in production, use a secure secret)
             password = getattr(settings, 'SECRET_KEY', 'default-secret-key-change-in-production').encode()
             salt = b'credential_encryption_salt'  # In production, use a random salt stored securely
-            
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=100000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(password))
-            return key
+            return _derive_key(password, salt)
         
         return key_string.encode()
     
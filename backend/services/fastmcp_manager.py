@@ -5,19 +5,21 @@ Using FastMCP framework for robust MCP server/client management
 import logging
 import asyncio
 import time
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, FrozenSet, Optional, List, Tuple
 from anyio import ClosedResourceError
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from fastmcp import Client
 from fastmcp.exceptions import McpError
 import json
+import re
 import traceback
 import hashlib
 import shutil
 import os
 import uuid
 from contextlib import AsyncExitStack
+from utils.json_utils import dumps as json_dumps
 
 # Import OpenLLMetry decorators and telemetry service
 try:
@@ -40,6 +42,38 @@ MAX_CONNECTION_ATTEMPTS = 3
 BASE_RETRY_DELAY = 2  # seconds
 MAX_RETRY_DELAY = 15  # seconds
 
+# Lower-case message fragments that classify a failed tool call, by category
+_ERROR_CATEGORY_NEEDLES = {
+    "auth": ("401", "unauthorized"),
+    "rate_limit": ("429", "too many requests", "rate limit"),
+    "timeout": ("timeout", "timed out"),
+    "connection": (
+        "connection refused",
+        "connection reset",
+        "broken pipe",
+        "connection closed",
+        "server disconnected",
+        "socket closed",
+        "network error",
+        "remote end closed",
+        "client is not connected",
+    ),
+}
+# One alternation over every needle, so a message is scanned once however many categories exist
+_ERROR_CATEGORY_PATTERN = re.compile("|".join(
+    f"(?P<{category}>{'|'.join(re.escape(needle) for needle in needles)})"
+    for category, needles in _ERROR_CATEGORY_NEEDLES.items()
+))
+_RETRY_AFTER_PATTERN = re.compile(r"retry-after[:\s]+(\d+)", re.IGNORECASE)
+
+
+def _error_categories(error: Exception) -> FrozenSet[str]:
+    """Categories of _ERROR_CATEGORY_NEEDLES whose fragments occur in the error message."""
+    categories = {match.lastgroup for match in _ERROR_CATEGORY_PATTERN.finditer(str(error).lower())}
+    if isinstance(error, (ConnectionError, BrokenPipeError, OSError, IOError)):
+        categories.add("connection")
+    return frozenset(categories)
+
 
 @dataclass
 class MCPServerConfig:
@@ -94,6 +128,8 @@ class FastMCPManager:
         # Tool result cache: (server_id, tool_name, args_hash) -> (result, timestamp)
         self._tool_cache: Dict[Tuple[str, str, str], Tuple[Any, datetime]] = {}
         self._cache_ttl = 30  # Cache results for 30 seconds
+        # Identical tool calls currently executing: same key as _tool_cache -> shared task
+        self._inflight_calls: Dict[Tuple[str, str, str], asyncio.Task] = {}
         # Circuit breaker: (server_id, tool_name) -> failure_count
         self._failure_counts: Dict[Tuple[str, str], int] = {}
         self._circuit_breaker_threshold = 3  # Open circuit after 3 consecutive failures
@@ -654,7 +690,7 @@ class FastMCPManager:
     
     def _get_cache_key(self, server_id: str, tool_name: str, arguments: Dict[str, Any]) -> str:
         """Generate a cache key for tool results"""
-        args_str = json.dumps(arguments, sort_keys=True)
+        args_str = json_dumps(arguments, sort_keys=True)
         return hashlib.md5(f"{server_id}:{tool_name}:{args_str}".encode()).hexdigest()
     
     def _get_cached_result(self, server_id: str, tool_name: str, arguments: Dict[str, Any]) -> Optional[Any]:
@@ -678,45 +714,50 @@ class FastMCPManager:
     
     def _is_rate_limit_error(self, error: Exception) -> bool:
         """Check if error is a rate limit (429)"""
-        error_str = str(error)
-        return "429" in error_str or "Too Many Requests" in error_str or "rate limit" in error_str.lower()
+        return "rate_limit" in _error_categories(error)
     
     def _is_timeout_error(self, error: Exception) -> bool:
         """Check if error is a timeout"""
-        error_str = str(error).lower()
-        return "timeout" in error_str or "timed out" in error_str
+        return "timeout" in _error_categories(error)
 
     def _is_connection_error(self, error: Exception) -> bool:
         """Check if error is a connection/network issue"""
-        error_str = str(error).lower()
-        connection_keywords = [
-            "connection refused",
-            "connection reset",
-            "broken pipe",
-            "connection closed",
-            "server disconnected",
-            "socket closed",
-            "network error",
-            "remote end closed",
-            "client is not connected"
-        ]
-        return (
-            isinstance(error, (ConnectionError, BrokenPipeError, OSError, IOError)) or
-            any(k in error_str for k in connection_keywords)
-        )
+        return "connection" in _error_categories(error)
     
     def _extract_retry_after(self, error: Exception) -> Optional[int]:
         """Extract Retry-After header value if present"""
         # This is a simple heuristic; in practice, you'd parse the actual HTTP response
-        error_str = str(error)
-        if "retry-after" in error_str.lower():
-            import re
-            match = re.search(r"retry-after[:\s]+(\d+)", error_str, re.IGNORECASE)
-            if match:
-                return int(match.group(1))
-        return None
+        match = _RETRY_AFTER_PATTERN.search(str(error))
+        return int(match.group(1)) if match else None
     
     async def call_tool(self, server_id: str, tool_name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        Call a tool on an MCP server, coalescing identical concurrent calls.
+        
+        MCP has no batch call, so concurrent agents issuing the same (server, tool, arguments)
+        share one in-flight request instead of each making a round-trip; once it finishes,
+        the result cache takes over for the rest of its TTL.
+        
+        Args:
+            server_id: Server ID
+            tool_name: Tool name (unprefixed)
+            arguments: Tool arguments
+            
+        Returns:
+            Tool execution result
+        """
+        call_key = (server_id, tool_name, self._get_cache_key(server_id, tool_name, arguments))
+        inflight = self._inflight_calls.get(call_key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._call_tool(server_id, tool_name, arguments))
+            self._inflight_calls[call_key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight_calls.pop(call_key, None))
+        else:
+            logger.debug(f"Joining in-flight call of {tool_name} on {server_id}")
+        # Shielded so one cancelled caller does not cancel the call for the others
+        return await asyncio.shield(inflight)
+    
+    async def _call_tool(self, server_id: str, tool_name: str, arguments: Dict[str, Any]) -> Any:
         """
         Call a tool on an MCP server with rate-limit handling and caching.
         
@@ -827,6 +868,8 @@ class FastMCPManager:
 
             except Exception as e:
                 last_error = e
+                # Classify once; the checks below only test set membership
+                categories = _error_categories(e)
                 
                 # Helper to handle retry exhaustion for system errors
                 async def handle_retry_or_raise(is_disconnect: bool = False):
@@ -841,31 +884,31 @@ class FastMCPManager:
                         await self.disconnect_server(server_id)
                     
                     # Wait before retry
-                    wait_time = base_delay if not self._is_rate_limit_error(e) else (self._extract_retry_after(e) or (base_delay * (2 ** (attempt - 1))))
-                    if self._is_rate_limit_error(e):
+                    wait_time = base_delay if "rate_limit" not in categories else (self._extract_retry_after(e) or (base_delay * (2 ** (attempt - 1))))
+                    if "rate_limit" in categories:
                         logger.warning(f"Rate limit hit for {tool_name}, waiting {wait_time}s")
-                    elif self._is_timeout_error(e):
+                    elif "timeout" in categories:
                         logger.warning(f"Timeout calling {tool_name}, retrying...")
                     
                     await asyncio.sleep(wait_time)
 
                 # 0. Check for Auth Errors -> Fail Fast
-                if "401" in str(e) or "Unauthorized" in str(e):
+                if "auth" in categories:
                     logger.error(f"Authentication failed for {server_id} during tool execution. This usually means the API key is invalid or has insufficient credits.")
                     raise Exception(f"Authentication failed for {server_id}. Please check your API key and credits/quota.")
 
                 # 1. Check for Rate Limits -> Wait & Retry
-                if self._is_rate_limit_error(e):
+                if "rate_limit" in categories:
                     await handle_retry_or_raise()
                     continue
                 
                 # 2. Check for Timeouts -> Wait & Retry
-                if self._is_timeout_error(e):
+                if "timeout" in categories:
                     await handle_retry_or_raise()
                     continue
 
                 # 3. Check for Connection Errors -> Disconnect & Retry
-                if self._is_connection_error(e):
+                if "connection" in categories:
                     logger.warning(f"Connection error calling {tool_name} on {server_id}: {e}")
                     await handle_retry_or_raise(is_disconnect=True)
                     continue
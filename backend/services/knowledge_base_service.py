@@ -2,7 +2,9 @@ import uuid
 import os
 import aiohttp
 from typing import List, Optional, Dict, Any
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from cachetools import TTLCache
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -28,6 +30,27 @@ def get_qdrant_client():
     return _qdrant_client
 
 
+# Whether an agent has any knowledge base, keyed by agent_id. Most agents have none, so agent
+# runs check this before constructing the service and querying. Entries are dropped when a
+# knowledge base is created or deleted here; the TTL bounds staleness across worker processes.
+_AGENT_HAS_KB: TTLCache = TTLCache(maxsize=4096, ttl=300)
+
+
+def agent_has_knowledge_bases(db: Session, agent_id: str) -> bool:
+    """Return whether the agent has at least one knowledge base (cached)"""
+    has_kb = _AGENT_HAS_KB.get(agent_id)
+    if has_kb is None:
+        query = select(KnowledgeBase.id).where(KnowledgeBase.agent_id == agent_id).limit(1)
+        has_kb = db.execute(query).first() is not None
+        _AGENT_HAS_KB[agent_id] = has_kb
+    return has_kb
+
+
+def invalidate_agent_kb_cache(agent_id: str) -> None:
+    """Forget the cached knowledge base presence of an agent"""
+    _AGENT_HAS_KB.pop(agent_id, None)
+
+
 class KnowledgeBaseService:
     def __init__(self, db: Session):
         self.db = db
@@ -87,6 +110,7 @@ class KnowledgeBaseService:
         self.db.add(db_kb)
         self.db.commit()
         self.db.refresh(db_kb)
+        invalidate_agent_kb_cache(kb_data.agent_id)
         return db_kb
     
     async def get_knowledge_base(self, kb_id: str) -> Optional[KnowledgeBase]:
@@ -108,6 +132,7 @@ class KnowledgeBaseService:
         self.db.query(KnowledgeDocument).filter(KnowledgeDocument.kb_id == kb_id).delete()
         self.db.delete(kb)
         self.db.commit()
+        invalidate_agent_kb_cache(kb.agent_id)
         return True
     
     def _chunk_text(self, text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
@@ -359,11 +384,11 @@ class KnowledgeBaseService:
             if not top_results:
                 return ""
             
-            context = "Relevant information from knowledge base:\n\n"
+            context_parts = ["Relevant information from knowledge base:\n\n"]
             for idx, result in enumerate(top_results, 1):
-                context += f"{idx}. {result.content}\n\n"
+                context_parts.append(f"{idx}. {result.content}\n\n")
             
-            return context
+            return "".join(context_parts)
         except Exception as e:
             # Log error and return empty context to allow agent to continue without KB
             print(f"Error querying agent knowledge: {str(e)}")
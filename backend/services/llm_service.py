@@ -2,8 +2,11 @@
 LLM service using LiteLLM for unified provider management
 """
 import os
+import asyncio
 import logging
+import weakref
 from typing import Optional, Dict, Any
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_groq import ChatGroq
@@ -20,6 +23,69 @@ from core.config import settings
 logger = logging.getLogger(__name__)
 
 
+# HTTP clients shared by every OpenAI-compatible and Groq client, so all agents reuse one
+# keep-alive connection pool per provider host instead of each opening its own. Async connections
+# belong to the event loop that opened them, so there is one async client per running loop.
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+_http_client: Optional[httpx.Client] = None
+_http_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+# Provider API hosts whose connections are opened at startup (ChatAnthropic does not accept
+# a custom HTTP client, so its connections cannot be shared and are not pre-warmed)
+_PREWARM_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "groq": "https://api.groq.com",
+}
+
+
+def http_client_kwargs() -> Dict[str, Any]:
+    """
+    Shared HTTP clients to pass to ChatOpenAI/ChatGroq, created on first use.
+    
+    The async client is the running event loop's own; outside a running loop it is omitted and
+    the LangChain client creates one when it first makes an async call.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_HTTP_LIMITS)
+    kwargs: Dict[str, Any] = {"http_client": _http_client}
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return kwargs
+    async_client = _http_async_clients.get(loop)
+    if async_client is None or async_client.is_closed:
+        async_client = _http_async_clients[loop] = httpx.AsyncClient(limits=_HTTP_LIMITS)
+    kwargs["http_async_client"] = async_client
+    return kwargs
+
+
+async def close_http_clients() -> None:
+    """Close the shared sync client and the running loop's async client; called on application shutdown."""
+    global _http_client
+    async_client = _http_async_clients.pop(asyncio.get_running_loop(), None)
+    if async_client is not None:
+        await async_client.aclose()
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+
+
+async def prewarm_provider_connections() -> None:
+    """Open connections to providers with a configured API key so the first agent call skips TCP/TLS setup."""
+    provider_keys = {"openai": settings.OPENAI_API_KEY, "groq": settings.GROQ_API_KEY}
+    urls = [url for provider, url in _PREWARM_URLS.items() if provider_keys.get(provider)]
+    if not urls:
+        return
+    client = http_client_kwargs()["http_async_client"]
+    results = await asyncio.gather(*(client.head(url, timeout=10.0) for url in urls), return_exceptions=True)
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            logger.debug(f"Connection pre-warm to {url} failed: {result}")
+        else:
+            logger.info(f"Pre-warmed connection to {url}")
+
+
 class LLMService:
     """Service for managing LLM interactions with LiteLLM"""
     
@@ -116,7 +182,8 @@ class LLMService:
                 model=model,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                api_key=api_key
+                api_key=api_key,
+                **http_client_kwargs()
             )
         elif provider.lower() == "anthropic":
             return ChatAnthropic(
@@ -130,7 +197,8 @@ class LLMService:
                 model=model,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                api_key=api_key
+                api_key=api_key,
+                **http_client_kwargs()
             )
         elif provider.lower() == "openrouter":
             # OpenRouter uses OpenAI-compatible API with custom base_url
@@ -143,6 +211,7 @@ class LLMService:
                 max_tokens=max_tokens,
                 api_key=api_key,
                 base_url="https://openrouter.ai/api/v1",
+                **http_client_kwargs(),
                 default_headers={
                     "HTTP-Referer": "https://execution-plane.local",
                     "X-Title": "Execution Plane Agent"
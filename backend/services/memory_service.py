@@ -186,6 +186,45 @@ Focus on statements of the form "User prefers X", "User is allergic to Y", "User
                 logger.error(f"Error adding memory for user_id {user_id}: {e}")
             return None
     
+    def add_memory_bulk(self, interactions: List[Dict[str, Any]]) -> int:
+        """
+        Add several queued interactions, one Mem0 extraction per user/agent/LLM group
+        
+        Args:
+            interactions: Dictionaries with the keyword arguments of add_memory
+                          (messages, user_id, agent_id, llm_provider, llm_model, api_key)
+            
+        Returns:
+            Number of Mem0 add calls that were made
+        """
+        if not self.is_enabled() or not interactions:
+            return 0
+        
+        # Group in arrival order so each conversation's messages stay in sequence
+        groups: Dict[tuple, List[Dict[str, str]]] = {}
+        for item in interactions:
+            key = (
+                item["user_id"],
+                item.get("agent_id"),
+                item.get("llm_provider", "groq"),
+                item.get("llm_model", "llama-3.1-8b-instant"),
+                item.get("api_key")
+            )
+            groups.setdefault(key, []).extend(item["messages"])
+        
+        for (user_id, agent_id, llm_provider, llm_model, api_key), messages in groups.items():
+            self.add_memory(
+                messages,
+                user_id=user_id,
+                agent_id=agent_id,
+                llm_provider=llm_provider,
+                llm_model=llm_model,
+                api_key=api_key
+            )
+        
+        logger.debug(f"Flushed {len(interactions)} queued interactions in {len(groups)} memory writes")
+        return len(groups)
+    
     def search_memory(
         self, 
         query: str, 
@@ -0,0 +1,111 @@
+"""
+Prompt Response Cache
+Exact-match and (optional) semantic-similarity cache for deterministic agent responses
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class PromptCache:
+    """
+    Two-tier response cache for agent executions.
+
+    The exact tier maps a SHA-256 of (scope, prompt) to the response. The semantic tier
+    keeps normalized prompt embeddings per scope (bounded like the responses, since scopes
+    vary per request context) and returns the response of the most similar earlier prompt
+    when the cosine similarity reaches the threshold. A scope
+    captures everything besides the user prompt that determines the answer (agent
+    version, model, system prompt, retrieved context), so entries never leak across them.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl: int = 3600,
+        similarity_threshold: float = 0.95,
+        embed_fn: Optional[Callable[[str], Optional[List[float]]]] = None,
+        max_vectors_per_scope: int = 256,
+        max_scopes: int = 1024,
+    ):
+        self._responses: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._similarity_threshold = similarity_threshold
+        self._embed_fn = embed_fn
+        self._max_vectors_per_scope = max_vectors_per_scope
+        # scope -> (normalized embedding matrix, exact cache keys of the rows)
+        self._vectors: TTLCache = TTLCache(maxsize=max_scopes, ttl=ttl)
+
+    @staticmethod
+    def make_scope(*parts) -> str:
+        """Build a scope identifier from the non-prompt inputs of a request."""
+        return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+
+    @staticmethod
+    def _make_key(scope: str, prompt: str) -> str:
+        return hashlib.sha256(f"{scope}|{prompt}".encode()).hexdigest()
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Embed and L2-normalize a prompt; None when the semantic tier is unavailable."""
+        if self._embed_fn is None:
+            return None
+        try:
+            embedding = await asyncio.to_thread(self._embed_fn, text)
+        except Exception as e:
+            logger.warning(f"Prompt cache embedding failed, skipping semantic lookup: {e}")
+            return None
+        if not embedding:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def get(self, scope: str, prompt: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Return a cached response for an identical or (semantically) near-identical prompt.
+
+        Also returns the prompt embedding computed for the semantic lookup (None if none was
+        needed), so a following set() for the same prompt does not embed it again.
+        """
+        cached = self._responses.get(self._make_key(scope, prompt))
+        if cached is not None:
+            logger.debug("Prompt cache exact hit")
+            return cached, None
+
+        entry = self._vectors.get(scope)
+        if entry is None:
+            return None, None
+        query = await self._embed(prompt)
+        if query is None:
+            return None, None
+        matrix, keys = entry
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self._similarity_threshold:
+            cached = self._responses.get(keys[best])
+            if cached is not None:
+                logger.debug(f"Prompt cache semantic hit (similarity {scores[best]:.3f})")
+                return cached, query
+        return None, query
+
+    async def set(self, scope: str, prompt: str, response: str, vector: Optional[np.ndarray] = None) -> None:
+        """Store a response for the prompt in both tiers, reusing the embedding from get() if given."""
+        key = self._make_key(scope, prompt)
+        self._responses[key] = response
+
+        if vector is None:
+            vector = await self._embed(prompt)
+        if vector is None:
+            return
+        matrix, keys = self._vectors.get(scope, (np.empty((0, vector.shape[0]), dtype=np.float32), []))
+        if matrix.shape[1] != vector.shape[0]:
+            # Embedding model changed; start the scope over
+            matrix, keys = np.empty((0, vector.shape[0]), dtype=np.float32), []
+        matrix = np.vstack([matrix, vector])[-self._max_vectors_per_scope:]
+        keys = (keys + [key])[-self._max_vectors_per_scope:]
+        self._vectors[scope] = (matrix, keys)
@@ -4,12 +4,30 @@ Handles rate limiting errors from LLM providers and automatically falls back to
 """
 import time
 import re
+import hashlib
+from collections import Counter
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Lower-case fragments that mark a provider error as a rate limit
+_RATE_LIMIT_INDICATORS = (
+    "429",
+    "rate limit",
+    "rate_limit",
+    "too many requests",
+    "quota exceeded",
+    "tokens per day",
+    "tpd",
+)
+
+# Wait-time phrasings used by providers, e.g. "try again in 22m46.848s"
+_TRY_AGAIN_IN_RE = re.compile(r'try again in (\d+)m(\d+(?:\.\d+)?)?s', re.IGNORECASE)
+_RETRY_AFTER_SECONDS_RE = re.compile(r'retry after (\d+) seconds?', re.IGNORECASE)
+_WAIT_MINUTES_RE = re.compile(r'wait (\d+) minutes?', re.IGNORECASE)
+
 
 class RateLimitHandler:
     """
@@ -73,39 +91,33 @@ class RateLimitHandler:
     # Track rate limit hits to avoid repeated failures
     _rate_limit_cache: Dict[str, datetime] = {}
     
+    # Per provider/model call outcomes, e.g. {"groq/llama-3.1-8b-instant:success": 12}
+    _outcomes: Counter = Counter()
+    
     @staticmethod
     def is_rate_limit_error(error_msg: str) -> bool:
         """Check if error is a rate limit error"""
-        rate_limit_indicators = [
-            "429",
-            "rate limit",
-            "rate_limit",
-            "too many requests",
-            "quota exceeded",
-            "tokens per day",
-            "TPD"
-        ]
         error_lower = error_msg.lower()
-        return any(indicator in error_lower for indicator in rate_limit_indicators)
+        return any(indicator in error_lower for indicator in _RATE_LIMIT_INDICATORS)
     
     @staticmethod
     def extract_wait_time(error_msg: str) -> Optional[int]:
         """Extract wait time from rate limit error message (in seconds)"""
         try:
             # Pattern 1: "try again in 22m46.848s"
-            match = re.search(r'try again in (\d+)m(\d+(?:\.\d+)?)?s', error_msg, re.IGNORECASE)
+            match = _TRY_AGAIN_IN_RE.search(error_msg)
             if match:
                 minutes = int(match.group(1))
                 seconds = float(match.group(2)) if match.group(2) else 0
                 return int(minutes * 60 + seconds)
             
             # Pattern 2: "retry after 120 seconds"
-            match = re.search(r'retry after (\d+) seconds?', error_msg, re.IGNORECASE)
+            match = _RETRY_AFTER_SECONDS_RE.search(error_msg)
             if match:
                 return int(match.group(1))
             
             # Pattern 3: "wait 5 minutes"
-            match = re.search(r'wait (\d+) minutes?', error_msg, re.IGNORECASE)
+            match = _WAIT_MINUTES_RE.search(error_msg)
             if match:
                 return int(match.group(1)) * 60
             
@@ -204,9 +216,21 @@ class RateLimitHandler:
         return None
     
     @staticmethod
-    def cache_rate_limit(provider: str, model: str, wait_seconds: Optional[int] = None):
+    def api_key_scope(api_key: Optional[str]) -> str:
+        """Short fingerprint of the API key a call used ("system" for the configured system key)"""
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else "system"
+    
+    @staticmethod
+    def _cache_key(provider: str, model: str, key_scope: Optional[str] = None) -> str:
+        """Cooldown cache key; scoped entries only describe the API key that was rate limited"""
+        return f"{provider}_{model}@{key_scope}" if key_scope else f"{provider}_{model}"
+    
+    @staticmethod
+    def cache_rate_limit(
+        provider: str, model: str, wait_seconds: Optional[int] = None, key_scope: Optional[str] = None
+    ):
         """Cache rate limit information to avoid repeated hits"""
-        cache_key = f"{provider}_{model}"
+        cache_key = RateLimitHandler._cache_key(provider, model, key_scope)
         if wait_seconds:
             cooldown_time = datetime.now() + timedelta(seconds=wait_seconds)
         else:
@@ -217,9 +241,37 @@ class RateLimitHandler:
         logger.info(f"Cached rate limit for {cache_key} until {cooldown_time}")
     
     @staticmethod
-    def is_cached_rate_limited(provider: str, model: str) -> bool:
-        """Check if a provider/model is known to be rate limited"""
-        cache_key = f"{provider}_{model}"
+    def cache_provider_rate_limit(provider: str, wait_seconds: Optional[int] = None):
+        """Put a whole provider in cooldown so get_alternative_provider skips it"""
+        RateLimitHandler.cache_rate_limit("provider", provider, wait_seconds)
+    
+    @staticmethod
+    def record_outcome(provider: str, model: str, success: bool):
+        """Count a call outcome for a provider/model"""
+        RateLimitHandler._outcomes[f"{provider}/{model}:{'success' if success else 'rate_limited'}"] += 1
+    
+    @staticmethod
+    def resolve_available_model(provider: str, model: str, key_scope: str) -> str:
+        """
+        Skip a model on which this API key is still in its rate limit cooldown
+        Returns the model itself when the key is not cooling down on it, otherwise the next model
+        of the same provider that the key is not cooling down on, or the original model when
+        there is none. Never switches provider: that only happens after the agent's own call
+        is rate limited.
+        """
+        if not RateLimitHandler.is_cached_rate_limited(provider, model, key_scope):
+            return model
+        
+        for candidate_model in RateLimitHandler.FALLBACK_MODELS.get(provider, []):
+            if candidate_model != model and not RateLimitHandler.is_cached_rate_limited(provider, candidate_model, key_scope):
+                return candidate_model
+        
+        return model
+    
+    @staticmethod
+    def is_cached_rate_limited(provider: str, model: str, key_scope: Optional[str] = None) -> bool:
+        """Check if a provider/model (optionally for one API key) is known to be rate limited"""
+        cache_key = RateLimitHandler._cache_key(provider, model, key_scope)
         if cache_key in RateLimitHandler._rate_limit_cache:
             cooldown_time = RateLimitHandler._rate_limit_cache[cache_key]
             if datetime.now() < cooldown_time:
@@ -253,7 +305,8 @@ class RateLimitHandler:
         status = {
             "total_cached": len(RateLimitHandler._rate_limit_cache),
             "by_provider": {},
-            "entries": []
+            "entries": [],
+            "outcomes": dict(RateLimitHandler._outcomes)
         }
         
         for key, cooldown_time in RateLimitHandler._rate_limit_cache.items():
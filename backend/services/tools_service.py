@@ -6,12 +6,30 @@ Supports: DuckDuckGo Search, Brave Search, GitHub Toolkit, Gmail Toolkit,
 
 from typing import List, Optional, Dict, Any
 import os
+import hashlib
 import logging
+from cachetools import TTLCache
 from langchain_core.tools import BaseTool, tool, StructuredTool
 from pydantic import BaseModel, Field
 from urllib.parse import urlparse
 from functools import partial
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from utils.json_utils import dumps as json_dumps
+
+
+# Initialized tool lists keyed by (tool name, hash of its config). ToolsService is created per
+# request, so the cache is module-level; the TTL bounds how long a placeholder returned for a
+# transient initialization failure is served.
+_TOOLS_CACHE: TTLCache = TTLCache(maxsize=256, ttl=600)
+
+# Tools bound to the event loop they were created on cannot be shared across requests
+_UNCACHEABLE_TOOLS = frozenset({"playwright_browser"})
+
+
+def _tool_cache_key(tool_name: str, config: Dict[str, Any]) -> tuple:
+    """Cache key for one tool; the config is hashed so API keys are not kept in the key."""
+    config_json = json_dumps(config, default=str, sort_keys=True)
+    return tool_name, hashlib.sha256(config_json.encode()).hexdigest()
 
 
 class ToolsService:
@@ -65,11 +83,19 @@ class ToolsService:
         for tool_name in tool_names:
             self.logger.debug(f"Processing tool: {tool_name}")
             if tool_name in self.available_tools:
+                tool_config = configs.get(tool_name, {})
+                cache_key = None if tool_name in _UNCACHEABLE_TOOLS else _tool_cache_key(tool_name, tool_config)
+                cached = _TOOLS_CACHE.get(cache_key) if cache_key else None
+                if cached is not None:
+                    tools.extend(cached)
+                    continue
                 try:
-                    tool_list = self.available_tools[tool_name](configs.get(tool_name, {}))
+                    tool_list = self.available_tools[tool_name](tool_config)
                     self.logger.debug(f"Tool {tool_name} initialized with {len(tool_list)} tools: {[t.name if hasattr(t, 'name') else str(t) for t in tool_list]}")
                     if tool_list:
                         tools.extend(tool_list)
+                        if cache_key:
+                            _TOOLS_CACHE[cache_key] = tool_list
                 except Exception as e:
                     self.logger.error(f"Error initializing tool {tool_name}: {e}", exc_info=True)
             else:
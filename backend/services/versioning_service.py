@@ -118,6 +118,10 @@ class VersioningService:
         self.db.commit()
         self.db.refresh(agent)
         
+        # Drop cached lookups so the restored configuration is used immediately
+        from services.agent_service import invalidate_agent_cache
+        invalidate_agent_cache(agent_id)
+        
         return agent
     
     async def compare_agent_versions(self, agent_id: str, version1: int, version2: int) -> Dict[str, Any]:
@@ -11,6 +11,7 @@ from core.database import Base, get_db
 from models.agent import Agent
 from models.workflow import Workflow
 from models.user import User, Tenant
+from models.versioning import AgentVersion
 
 
 # Test database URL (in-memory SQLite)
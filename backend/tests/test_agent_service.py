@@ -78,3 +78,243 @@ async def test_delete_agent(db_session, test_agent):
     agent = await agent_service.get_agent(test_agent.agent_id)
     assert agent is None
 
+
+def test_pii_middleware_skipped_without_active_rules(db_session, test_agent):
+    """Test that PII middleware is not built when no PII types are blocked"""
+    agent_service = AgentService(db_session)
+    
+    test_agent.pii_config = {"blocked_pii_types": [], "strategy": "redact"}
+    assert agent_service._get_pii_middleware(test_agent) is None
+    
+    test_agent.pii_config = {"blocked_pii_types": ["pii_email"], "strategy": "redact"}
+    pii_middleware = agent_service._get_pii_middleware(test_agent)
+    assert pii_middleware is not None
+    assert pii_middleware.process_message("mail me at a@b.com") == "mail me at [REDACTED_EMAIL]"
+
+
+@pytest.mark.asyncio
+async def test_reflection_agent_reuses_cached_node_responses(db_session, test_agent):
+    """Test that deterministic workflow agents reuse node responses only for inputs differing in whitespace"""
+    from langchain_core.language_models import FakeListLLM
+    
+    agent_service = AgentService(db_session)
+    test_agent.temperature = 0
+    test_agent.system_prompt = "You are a node cache test agent"
+    llm = FakeListLLM(responses=[
+        '{"draft": "draft", "critique": "critique", "revision": "revision"}',
+        '{"draft": "draft", "critique": "critique", "revision": "other revision"}'
+    ])
+    graph = agent_service._create_reflection_agent(llm, test_agent)
+    
+    first = await graph.ainvoke({"input": "What is the capital of  France?"})
+    second = await graph.ainvoke({"input": " What is the capital of France? "})
+    third = await graph.ainvoke({"input": "what is the capital of france"})
+    
+    assert first["agent_revision"] == "revision"
+    assert second["agent_revision"] == "revision"
+    assert third["agent_revision"] == "other revision"
+
+
+@pytest.mark.asyncio
+async def test_arun_batch_rejects_react_agents(db_session, test_agent):
+    """Test that batch execution is limited to workflow agent types"""
+    agent_service = AgentService(db_session)
+    
+    with pytest.raises(ValueError):
+        await agent_service.arun_batch(test_agent.agent_id, ["hello"])
+
+
+@pytest.mark.asyncio
+async def test_plan_execute_agent_plans_and_executes_in_one_call(db_session, test_agent):
+    """Test that the plan and its first step come from a single LLM call, capped at the maximum steps"""
+    from langchain_core.language_models import FakeListLLM
+    
+    agent_service = AgentService(db_session)
+    llm = FakeListLLM(responses=[
+        '{"plan": ["a", "2. b", "c", "d", "e", "f"], "result": "step result"}',
+        "unexpected"
+    ])
+    graph = agent_service._create_plan_execute_agent(llm, test_agent)
+    
+    result = await graph.ainvoke({"input": "Plan a trip"})
+    
+    assert result["agent_plan"] == "1. a\n2. b\n3. c\n4. d\n5. e"
+    assert [step.content for step in result["past_steps"]] == ["step result"]
+
+
+@pytest.mark.asyncio
+async def test_react_graph_cached_only_for_agents_without_tools(db_session, test_agent):
+    """Test that compiled ReAct graphs are reused only for agents without tools"""
+    agent_service = AgentService(db_session)
+    agent_service._initialize_llm = lambda *args, **kwargs: object()
+    
+    async def build_react_agent(llm, agent_config):
+        return object()
+    
+    agent_service._create_react_agent = build_react_agent
+    agent = await agent_service.get_agent(test_agent.agent_id)
+    
+    first, _ = await agent_service._create_langgraph_agent(agent)
+    second, _ = await agent_service._create_langgraph_agent(agent)
+    assert first is second
+    
+    tool_agent = agent.model_copy(update={"tools": ["web_search"]})
+    first, _ = await agent_service._create_langgraph_agent(tool_agent)
+    second, _ = await agent_service._create_langgraph_agent(tool_agent)
+    assert first is not second
+
+
+@pytest.mark.asyncio
+async def test_graph_cache_invalidated_on_update_and_rollback(db_session, test_agent):
+    """Test that an agent's compiled graphs are dropped when it is updated or rolled back"""
+    from services.agent_service import _REACT_GRAPH_CACHE
+    from services.versioning_service import VersioningService
+    
+    agent_service = AgentService(db_session)
+    agent_service._initialize_llm = lambda *args, **kwargs: object()
+    
+    async def build_react_agent(llm, agent_config):
+        return object()
+    
+    agent_service._create_react_agent = build_react_agent
+    
+    def cached_graph_keys():
+        return [key for key in _REACT_GRAPH_CACHE.keys() if key[0] == test_agent.agent_id]
+    
+    versioning_service = VersioningService(db_session)
+    await versioning_service.create_agent_version(test_agent.agent_id)
+    await agent_service._create_langgraph_agent(await agent_service.get_agent(test_agent.agent_id))
+    assert cached_graph_keys()
+    
+    await agent_service.update_agent(test_agent.agent_id, AgentCreate(
+        name="Updated Agent",
+        agent_type="react",
+        llm_provider="openai",
+        llm_model="gpt-4",
+        temperature=0.2,
+        max_iterations=10,
+        streaming_enabled=True,
+        human_in_loop=False,
+        recursion_limit=25
+    ))
+    assert not cached_graph_keys()
+    
+    await agent_service._create_langgraph_agent(await agent_service.get_agent(test_agent.agent_id))
+    assert cached_graph_keys()
+    
+    await versioning_service.rollback_agent(test_agent.agent_id, 2)
+    assert not cached_graph_keys()
+    assert (await agent_service.get_agent(test_agent.agent_id)).llm_model == test_agent.llm_model
+
+
+@pytest.mark.asyncio
+async def test_get_agent_cache_returns_copies_and_invalidates(db_session, test_agent):
+    """Test that cached agents are handed out as copies and refreshed after update and rollback"""
+    from services.versioning_service import VersioningService
+    
+    agent_service = AgentService(db_session)
+    versioning_service = VersioningService(db_session)
+    await versioning_service.create_agent_version(test_agent.agent_id)
+    
+    agent = await agent_service.get_agent(test_agent.agent_id)
+    agent.name = "Mutated by caller"
+    assert (await agent_service.get_agent(test_agent.agent_id)).name == "Test Agent"
+    
+    await agent_service.update_agent(test_agent.agent_id, AgentCreate(
+        name="Updated Agent",
+        agent_type="react",
+        llm_provider="openai",
+        llm_model="gpt-4",
+        temperature=0.2,
+        max_iterations=10,
+        streaming_enabled=True,
+        human_in_loop=False,
+        recursion_limit=25
+    ))
+    assert (await agent_service.get_agent(test_agent.agent_id)).name == "Updated Agent"
+    
+    await versioning_service.rollback_agent(test_agent.agent_id, 2)
+    assert (await agent_service.get_agent(test_agent.agent_id)).name == "Test Agent"
+
+
+@pytest.mark.asyncio
+async def test_memory_write_queue_reaches_add_memory_bulk():
+    """Test that queued memory writes reach each memory service's add_memory_bulk by shutdown"""
+    from services.agent_service import _MemoryWriteQueue
+    
+    class RecordingMemoryService:
+        def __init__(self):
+            self.batches = []
+        
+        def add_memory_bulk(self, interactions):
+            self.batches.append(interactions)
+            return len(interactions)
+    
+    first_service, second_service = RecordingMemoryService(), RecordingMemoryService()
+    queue = _MemoryWriteQueue()
+    queue.enqueue(first_service, messages=[{"role": "user", "content": "hi"}], user_id="u1")
+    queue.enqueue(second_service, messages=[{"role": "user", "content": "hello"}], user_id="u2")
+    queue.enqueue(first_service, messages=[{"role": "user", "content": "bye"}], user_id="u1")
+    await queue.drain(timeout=5)
+    
+    assert [item["user_id"] for batch in first_service.batches for item in batch] == ["u1", "u1"]
+    assert [item["user_id"] for batch in second_service.batches for item in batch] == ["u2"]
+
+
+def test_classify_llm_error_requires_provider_for_auth_and_rate_limits():
+    """Test that LLM errors are classified by token, with auth and rate limit errors tied to a provider"""
+    from services.agent_service import _classify_llm_error
+    
+    assert _classify_llm_error("Groq error code: 429 - rate limit reached") == {"rate_limit"}
+    assert _classify_llm_error("Processed 429 rows") == frozenset()
+    assert _classify_llm_error("OpenAI error code: 401 - Incorrect API key provided") == {"api_key"}
+    assert _classify_llm_error("Anthropic returned 403 Forbidden") == {"forbidden"}
+    assert _classify_llm_error("Error code: 400 - tool_use_failed") == {"tool"}
+    assert _classify_llm_error("The model `llama3-70b-8192` has been decommissioned") == {"decommissioned"}
+
+
+@pytest.mark.asyncio
+async def test_streaming_forwards_llm_tokens(db_session, test_agent):
+    """Test that tokens from astream_events reach the websocket as they are generated"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from engine.builder import AgentBuilder
+    import json
+    
+    class RecordingWebSocket:
+        def __init__(self):
+            self.events = []
+        
+        async def send_text(self, text):
+            self.events.append(json.loads(text))
+    
+    agent_service = AgentService(db_session)
+    graph = AgentBuilder(FakeListChatModel(responses=["hello there"])).build("You are a streaming test agent")
+    
+    async def create_langgraph_agent(agent_config, memory_context="", *args, **kwargs):
+        return graph, []
+    
+    agent_service._create_langgraph_agent = create_langgraph_agent
+    websocket = RecordingWebSocket()
+    
+    response = await agent_service._execute_agent_with_streaming(
+        test_agent.agent_id, "hi", "session_test", websocket, "run_test"
+    )
+    
+    tokens = [event["content"] for event in websocket.events if event["type"] == "llm_token"]
+    assert response == "hello there"
+    assert "".join(tokens) == "hello there"
+    assert websocket.events[-1]["type"] == "agent_complete"
+
+
+def test_node_fingerprint_changes_with_node_definition():
+    """Test that node cache fingerprints change with the prompt template, token cap and output schema"""
+    from services.agent_service import (
+        _node_fingerprint, _workflow_prompt, _PLAN_EXECUTE_PROMPT, PlanExecuteOutput
+    )
+    
+    fingerprint = _node_fingerprint(_PLAN_EXECUTE_PROMPT, 360, PlanExecuteOutput)
+    
+    assert fingerprint == _node_fingerprint(_PLAN_EXECUTE_PROMPT, 360, PlanExecuteOutput)
+    assert fingerprint != _node_fingerprint(_workflow_prompt("Plan briefly.\nRequest: {input}"), 360, PlanExecuteOutput)
+    assert fingerprint != _node_fingerprint(_PLAN_EXECUTE_PROMPT, 200, PlanExecuteOutput)
+    assert fingerprint != _node_fingerprint(_PLAN_EXECUTE_PROMPT, 360)
@@ -0,0 +1,56 @@
+"""
+Unit tests for FastMCPManager
+"""
+import asyncio
+
+import pytest
+from services.fastmcp_manager import FastMCPManager
+
+
+class SlowClient:
+    """MCP client double whose tool calls take a moment and are counted"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    async def call_tool(self, name, arguments):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"name": name, "arguments": arguments}
+
+
+@pytest.mark.asyncio
+async def test_call_tool_coalesces_identical_inflight_calls():
+    """Test that identical concurrent tool calls share one request and different arguments do not"""
+    manager = FastMCPManager()
+    client = SlowClient()
+    manager.clients["server-1"] = client
+    
+    results = await asyncio.gather(
+        *(manager.call_tool("server-1", "lookup", {"q": "a"}) for _ in range(3)),
+        manager.call_tool("server-1", "lookup", {"q": "b"}),
+    )
+    
+    assert client.calls == 2
+    assert results[0] == results[1] == results[2]
+    assert manager._inflight_calls == {}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    """Test that cancelling one caller of a coalesced tool call leaves the call running for the others"""
+    manager = FastMCPManager()
+    client = SlowClient()
+    manager.clients["server-1"] = client
+    
+    cancelled = asyncio.ensure_future(manager.call_tool("server-1", "lookup", {"q": "a"}))
+    waiting = asyncio.ensure_future(manager.call_tool("server-1", "lookup", {"q": "a"}))
+    await asyncio.sleep(0.01)
+    cancelled.cancel()
+    
+    result = await waiting
+    
+    assert cancelled.cancelled()
+    assert client.calls == 1
+    assert result is not None
+    assert manager._inflight_calls == {}
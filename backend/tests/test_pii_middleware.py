@@ -0,0 +1,30 @@
+"""
+Unit tests for PIIMiddleware
+"""
+from middleware.pii_middleware import PIIMiddleware, PIIStrategy
+
+
+def test_prefilter_matches_regex_only_filtering():
+    """Test that filtering with the prefilter gives the same result as running every rule's regex"""
+    middleware = PIIMiddleware(
+        blocked_pii_types=["pii_email", "pii_phone", "pii_ssn", "pii_ip", "pii_custom_ticket"],
+        custom_pii_configs=[{"id": "pii_custom_ticket", "label": "Ticket", "pattern": r"TICKET-\d{4}"}],
+        default_strategy=PIIStrategy.REDACT,
+    )
+    regex_only = PIIMiddleware(
+        blocked_pii_types=["pii_email", "pii_phone", "pii_ssn", "pii_ip", "pii_custom_ticket"],
+        custom_pii_configs=[{"id": "pii_custom_ticket", "label": "Ticket", "pattern": r"TICKET-\d{4}"}],
+        default_strategy=PIIStrategy.REDACT,
+    )
+    all_rules = set(range(len(regex_only._compiled_rules)))
+    regex_only._prefilter.candidates = lambda text: all_rules
+    
+    texts = [
+        "no personal data here",
+        "mail a@b.com or call 555-123-4567",
+        "ssn 123-45-6789 from 10.0.0.1 about ticket-1234",
+        "",
+    ]
+    for text in texts:
+        assert middleware.filter_text(text) == regex_only.filter_text(text)
+    assert "a@b.com" not in middleware.filter_text(texts[1])
@@ -0,0 +1,60 @@
+"""
+Unit tests for PromptCache
+"""
+import pytest
+from services.prompt_cache import PromptCache
+
+
+@pytest.mark.asyncio
+async def test_prompt_cache_exact_hit_is_scoped():
+    """Test that exact hits only apply within the same scope"""
+    cache = PromptCache()
+    scope = PromptCache.make_scope("agent-1", "openai", "gpt-4o", 0)
+    other_scope = PromptCache.make_scope("agent-2", "openai", "gpt-4o", 0)
+    
+    await cache.set(scope, "What is 2+2?", "4")
+    
+    assert (await cache.get(scope, "What is 2+2?"))[0] == "4"
+    assert (await cache.get(other_scope, "What is 2+2?"))[0] is None
+    assert (await cache.get(scope, "What is 3+3?"))[0] is None
+
+
+@pytest.mark.asyncio
+async def test_prompt_cache_semantic_hit_above_threshold():
+    """Test that near-identical prompts reuse a response when embeddings are similar enough"""
+    embeddings = {
+        "What is the capital of France?": [1.0, 0.0, 0.0],
+        "Capital of France?": [0.99, 0.05, 0.0],
+        "How tall is Everest?": [0.0, 1.0, 0.0],
+    }
+    cache = PromptCache(similarity_threshold=0.95, embed_fn=embeddings.get)
+    scope = PromptCache.make_scope("agent-1")
+    
+    await cache.set(scope, "What is the capital of France?", "Paris")
+    
+    assert (await cache.get(scope, "Capital of France?"))[0] == "Paris"
+    assert (await cache.get(scope, "How tall is Everest?"))[0] is None
+
+
+@pytest.mark.asyncio
+async def test_prompt_cache_miss_embeds_prompt_once_and_bounds_scopes():
+    """Test that a miss followed by set embeds the prompt once and that old scopes are evicted"""
+    calls = []
+    
+    def embed(text):
+        calls.append(text)
+        return [1.0, float(len(calls)), 0.0]
+    
+    cache = PromptCache(similarity_threshold=0.9999, embed_fn=embed, max_scopes=2)
+    scopes = [PromptCache.make_scope(f"agent-{i}") for i in range(3)]
+    
+    await cache.set(scopes[0], "first", "1")
+    response, vector = await cache.get(scopes[0], "second")
+    await cache.set(scopes[0], "second", "2", vector)
+    assert response is None
+    assert calls == ["first", "second"]
+    
+    await cache.set(scopes[1], "first", "1")
+    await cache.set(scopes[2], "first", "1")
+    assert len(cache._vectors) == 2
+    assert scopes[0] not in cache._vectors
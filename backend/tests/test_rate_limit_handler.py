@@ -0,0 +1,22 @@
+"""
+Unit tests for RateLimitHandler
+"""
+from services.rate_limit_handler import RateLimitHandler
+
+
+def test_resolve_available_model_is_scoped_to_api_key_and_provider():
+    """Test that pre-emptive model skipping only applies to the rate-limited API key, within its provider"""
+    RateLimitHandler._rate_limit_cache.clear()
+    limited_key = RateLimitHandler.api_key_scope("gsk_limited")
+    other_key = RateLimitHandler.api_key_scope("gsk_other")
+    
+    RateLimitHandler.cache_rate_limit("groq", "llama-3.3-70b-versatile", 300)
+    RateLimitHandler.cache_rate_limit("groq", "llama-3.3-70b-versatile", 300, limited_key)
+    
+    assert RateLimitHandler.resolve_available_model("groq", "llama-3.3-70b-versatile", other_key) == "llama-3.3-70b-versatile"
+    assert RateLimitHandler.resolve_available_model("groq", "llama-3.3-70b-versatile", limited_key) == "llama-3.1-8b-instant"
+    
+    for model in RateLimitHandler.FALLBACK_MODELS["groq"]:
+        RateLimitHandler.cache_rate_limit("groq", model, 300, limited_key)
+    assert RateLimitHandler.resolve_available_model("groq", "llama-3.3-70b-versatile", limited_key) == "llama-3.3-70b-versatile"
+    RateLimitHandler._rate_limit_cache.clear()
@@ -0,0 +1,38 @@
+"""
+JSON serialization helpers for hot paths (streaming events, protocol messages)
+"""
+import json
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# Non-string keys are stringified like json.dumps does; datetimes go through `default` so that
+# default=str produces the same text as the stdlib
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if ORJSON_AVAILABLE else 0
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None, sort_keys: bool = False) -> str:
+    """
+    Serialize obj to a compact JSON string, using orjson when it is installed
+    
+    Args:
+        obj: Object to serialize
+        default: Called for objects that are not natively serializable (as in json.dumps)
+        sort_keys: Sort dict keys, for canonical output used in cache keys and hashes
+    
+    Returns:
+        JSON string (non-ASCII characters are not escaped)
+    """
+    if ORJSON_AVAILABLE:
+        try:
+            option = _ORJSON_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else _ORJSON_OPTIONS
+            return orjson.dumps(obj, default=default, option=option).decode()
+        except TypeError:
+            # e.g. integers beyond 64 bits; let the stdlib serialize (or reject) it
+            pass
+    return json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False, sort_keys=sort_keys)